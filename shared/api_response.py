@@ -0,0 +1,81 @@
+"""JSON Lambda responses, with DynamoDB types encoded as proper JSON.
+
+Package this file next to the handler (`zip -j function.zip handler.py
+../shared/api_response.py`):
+
+    from api_response import response
+    return response(200, {'count': len(items), 'users': items})
+
+Items read through boto3 carry Decimal numbers, sets and Binary values,
+which json.dumps rejects. Encoding them with `default=str` turns numbers into
+strings. Here Decimals become ints or floats, sets become lists and binary
+values become base64 strings.
+
+Converting Decimals this way costs more than `default=str`. Read handlers
+therefore create their tables with `json_numbers=True` (see aws_clients.py):
+their items carry no Decimals, json's C encoder handles them on its own, and
+the converters below only run for sets, binary values and dates.
+"""
+import base64
+import json
+import sys
+from datetime import date, datetime
+from decimal import Decimal
+
+# Shared by every response: don't modify it, pass extra headers to response().
+JSON_HEADERS = {
+    'Content-Type': 'application/json',
+    'Access-Control-Allow-Origin': '*'
+}
+
+def encode_decimal(value):
+    # DynamoDB numbers: 42 becomes 42, 4.25 becomes 4.25. Going through str()
+    # is cheaper than Decimal arithmetic.
+    text = str(value)
+    return float(text) if '.' in text or 'E' in text else int(text)
+
+def encode_set(value):
+    # Number and string sets sort; binary sets keep set order.
+    try:
+        return sorted(value)
+    except TypeError:
+        return list(value)
+
+def encode_bytes(value):
+    return base64.b64encode(value).decode('ascii')
+
+# Exact-type dispatch keeps the per-value fallback to one dict lookup.
+ENCODERS = {
+    Decimal: encode_decimal,
+    set: encode_set,
+    frozenset: encode_set,
+    bytes: encode_bytes,
+    bytearray: encode_bytes,
+    datetime: lambda value: value.isoformat(),
+    date: lambda value: value.isoformat(),
+}
+
+def encode_default(value):
+    """Called by the encoder for types JSON has no encoding for."""
+    encode = ENCODERS.get(type(value))
+    if encode is None:
+        # boto3 is not imported here, to keep it off the cold start; a Binary
+        # value means it is loaded already.
+        types = sys.modules.get('boto3.dynamodb.types')
+        if types is not None and isinstance(value, types.Binary):
+            return encode_bytes(value.value)
+        raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+    return encode(value)
+
+encoder = json.JSONEncoder(default=encode_default, separators=(',', ':'))
+
+def dumps(value):
+    return encoder.encode(value)
+
+def response(status_code, body, headers=None):
+    """API Gateway proxy response; body=None sends an empty body."""
+    return {
+        'statusCode': status_code,
+        'headers': dict(JSON_HEADERS, **headers) if headers else JSON_HEADERS,
+        'body': dumps(body) if body is not None else ''
+    }
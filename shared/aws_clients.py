@@ -0,0 +1,198 @@
+"""Lazily created, tuned boto3 clients, resources and tables that share one session.
+
+Package this file next to the handler (`zip -j function.zip handler.py
+../shared/aws_clients.py`) and declare the clients at module level:
+
+    s3 = client('s3', concurrency=MAX_WORKERS)
+    orders_table = table('Orders')
+
+Each call returns a stand-in that builds the real object when one of its
+attributes is first used. A cold start therefore only pays for the clients
+the request actually touches, and boto3 itself is not imported until then.
+Everything comes from one boto3 session, and so one botocore session, per
+container. Endpoint data and service models are loaded once rather than once
+per client.
+
+Every client gets the same tuned config:
+- max_pool_connections is at least the largest `concurrency` declared for the
+  service. botocore's default pool of 10 makes a wider thread pool queue for
+  connections.
+- Short connect and read timeouts (CLIENT_CONNECT_TIMEOUT, default 3s;
+  CLIENT_READ_TIMEOUT, default 10s), so a stuck connection is retried instead
+  of using up the Lambda timeout.
+- TCP keep-alive on the pooled connections.
+- Adaptive retries (AWS_RETRY_MODE, AWS_MAX_ATTEMPTS), which add client-side
+  rate limiting when throttled.
+
+The endpoint is AWS_ENDPOINT_URL, then LocalStack's LOCALSTACK_HOSTNAME
+inside a LocalStack Lambda, then localhost:4566. Set AWS_ENDPOINT_URL to an
+empty string for the real AWS endpoints. Pass endpoint_url= or config= to
+override either one for a single client.
+
+DynamoDB resources and tables created with json_numbers=True return numbers
+as int and float rather than Decimal, so json.dumps encodes the items they
+read without a default= hook.
+
+Set STARTUP_PROFILE=1 to log how long the boto3 import and each creation
+took; startup_profile() returns the same numbers.
+tools/profile_cold_start.py adds the handler's per-module import times.
+"""
+import os
+import threading
+import time
+
+def default_endpoint_url():
+    if 'AWS_ENDPOINT_URL' in os.environ:
+        return os.environ['AWS_ENDPOINT_URL'] or None
+    if os.environ.get('LOCALSTACK_HOSTNAME'):
+        return f"http://{os.environ['LOCALSTACK_HOSTNAME']}:{os.environ.get('EDGE_PORT', '4566')}"
+    return 'http://localhost:4566'
+
+ENDPOINT_URL = default_endpoint_url()
+CONNECT_TIMEOUT = float(os.environ.get('CLIENT_CONNECT_TIMEOUT', '3'))
+READ_TIMEOUT = float(os.environ.get('CLIENT_READ_TIMEOUT', '10'))
+MIN_POOL_CONNECTIONS = int(os.environ.get('CLIENT_MIN_POOL_CONNECTIONS', '10'))
+RETRY_MODE = os.environ.get('AWS_RETRY_MODE', 'adaptive')
+MAX_ATTEMPTS = int(os.environ.get('AWS_MAX_ATTEMPTS', '3'))
+STARTUP_PROFILE = os.environ.get('STARTUP_PROFILE', '').lower() in ('1', 'true', 'yes')
+
+# Creation holds the lock: botocore sessions are not safe to share between
+# threads while they build clients.
+lock = threading.RLock()
+instances = {}
+timings = {}
+_session = None
+
+class Lazy:
+    """Stand-in for a client, resource or table, created on first attribute access."""
+    def __init__(self, label, create, parent=None):
+        self._label = label
+        self._create = create
+        self._parent = parent
+        self._target = None
+        self._concurrency = 0
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+
+    def _require(self, concurrency):
+        # Only declarations made before creation can size the pool.
+        with lock:
+            self._concurrency = max(self._concurrency, concurrency or 0)
+        if self._parent is not None:
+            self._parent._require(concurrency)
+
+    def _get(self):
+        if self._target is None:
+            with lock:
+                if self._target is None:
+                    # Session and parent first, so that their time is not counted twice.
+                    session()
+                    if self._parent is not None:
+                        self._parent._get()
+                    self._target = timed(self._label, lambda: self._create(self._concurrency))
+        return self._target
+
+    def __repr__(self):
+        state = 'created' if self._target is not None else 'not created'
+        return f'<Lazy {self._label} ({state})>'
+
+def timed(label, create):
+    start = time.perf_counter()
+    value = create()
+    ms = round((time.perf_counter() - start) * 1000, 2)
+    timings[label] = ms
+    if STARTUP_PROFILE:
+        print(f'Startup profile: {label} {ms} ms')
+    return value
+
+def session():
+    """The container's boto3 session, created on first use."""
+    global _session
+    with lock:
+        if _session is None:
+            boto3 = timed('import boto3', lambda: __import__('boto3'))
+            _session = timed('session', boto3.session.Session)
+    return _session
+
+def client_config(concurrency=0, config=None):
+    """This module's botocore Config; settings in `config` take precedence."""
+    from botocore.config import Config
+    tuned = Config(
+        connect_timeout=CONNECT_TIMEOUT,
+        read_timeout=READ_TIMEOUT,
+        tcp_keepalive=True,
+        max_pool_connections=max(MIN_POOL_CONNECTIONS, concurrency),
+        retries={'mode': RETRY_MODE, 'total_max_attempts': MAX_ATTEMPTS}
+    )
+    return tuned.merge(config) if config is not None else tuned
+
+def lazy(kind, name, kwargs, concurrency, create, parent=None):
+    key = (kind, name, tuple(sorted(kwargs.items())))
+    with lock:
+        if key not in instances:
+            instances[key] = Lazy(f'{kind} {name}', create, parent)
+    instances[key]._require(concurrency)
+    return instances[key]
+
+def create_kwargs(kwargs, concurrency):
+    kwargs = dict(kwargs)
+    if kwargs.get('endpoint_url') is None:
+        kwargs['endpoint_url'] = ENDPOINT_URL
+    kwargs['config'] = client_config(concurrency, kwargs.get('config'))
+    return kwargs
+
+def client(service_name, concurrency=None, **kwargs):
+    """boto3 client, created on first use; the same arguments give the same client.
+
+    concurrency: how many threads of the handler call it at once.
+    """
+    return lazy('client', service_name, kwargs, concurrency,
+                lambda pool: session().client(service_name, **create_kwargs(kwargs, pool)))
+
+def resource(service_name, concurrency=None, json_numbers=False, **kwargs):
+    """boto3 resource, created on first use.
+
+    json_numbers: for dynamodb, read numbers as int and float instead of Decimal.
+    """
+    def create(pool):
+        created = session().resource(service_name, **create_kwargs(kwargs, pool))
+        return use_json_numbers(created) if json_numbers else created
+    key = dict(kwargs, json_numbers=True) if json_numbers else kwargs
+    return lazy('resource', service_name, key, concurrency, create)
+
+def table(table_name, concurrency=None, json_numbers=False, **kwargs):
+    """DynamoDB Table; kwargs go to the underlying dynamodb resource."""
+    dynamodb = resource('dynamodb', concurrency, json_numbers, **kwargs)
+    key = dict(kwargs, json_numbers=True) if json_numbers else kwargs
+    return lazy('table', table_name, key, concurrency,
+                lambda pool: dynamodb._get().Table(table_name), dynamodb)
+
+def json_number(text):
+    # What json.loads gives for the same digits: int if whole, else float.
+    return float(text) if '.' in text or 'e' in text or 'E' in text else int(text)
+
+def use_json_numbers(dynamodb):
+    """Swap the dynamodb resource's response deserializer for one without Decimals.
+
+    Floats are not exact beyond 15-17 significant digits, and writing them back
+    through boto3 still needs Decimal.
+    """
+    from boto3.dynamodb.transform import TransformationInjector
+    from boto3.dynamodb.types import TypeDeserializer
+
+    class JsonNumberDeserializer(TypeDeserializer):
+        def _deserialize_n(self, value):
+            return json_number(value)
+
+    injector = TransformationInjector(deserializer=JsonNumberDeserializer())
+    # Each resource has its own client, so this leaves other resources alone.
+    events = dynamodb.meta.client.meta.events
+    events.unregister('after-call.dynamodb', unique_id='dynamodb-attr-value-output')
+    events.register('after-call.dynamodb', injector.inject_attribute_value_output,
+                    unique_id='dynamodb-attr-value-output')
+    return dynamodb
+
+def startup_profile():
+    """Milliseconds spent on the boto3 import, the session and each client so far."""
+    return dict(timings)
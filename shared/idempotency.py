@@ -0,0 +1,137 @@
+"""Idempotency guard for at-least-once consumers (SQS, S3 events).
+
+Package this file next to the handler, together with the client factory
+(`zip -j function.zip handler.py ../shared/idempotency.py
+../shared/aws_clients.py`), and wrap the side-effecting work:
+
+    guard = IdempotencyGuard(os.environ.get('IDEMPOTENCY_TABLE'))
+    result, duplicate = guard.run(f"task-processor#{message_id}", do_work)
+
+Completed keys are remembered in a per-container LRU and in a DynamoDB table
+(partition key `id`, TTL attribute `expiresAt`). The first caller claims a
+key with a conditional put; redeliveries of a completed key get the recorded
+result back without running the work again. A redelivery that arrives while
+the first attempt is still running raises DuplicateInProgress, so the message
+is retried after the visibility timeout.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from botocore.exceptions import ClientError
+
+from aws_clients import client
+
+# DynamoDB items are capped at 400 KB; larger results are recorded without a body.
+MAX_STORED_RESULT_BYTES = 300 * 1024
+
+class DuplicateInProgress(Exception):
+    """Another invocation is currently processing the same key."""
+
+class IdempotencyGuard:
+    def __init__(self, table_name, ttl_seconds=86400, lease_seconds=300, cache_size=1024,
+                 endpoint_url=None, concurrency=None):
+        """table_name=None disables the guard; run() then always does the work.
+
+        concurrency is how many threads call run() at once, to size the client's pool.
+        """
+        self.table_name = table_name
+        self.ttl_seconds = ttl_seconds
+        self.lease_seconds = lease_seconds
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {'cache_hits': 0, 'store_hits': 0, 'executed': 0}
+        # Low-level client rather than a Table resource: clients are thread-safe.
+        # It is only created once run() needs it.
+        self.client = client('dynamodb', concurrency, endpoint_url=endpoint_url)
+
+    def run(self, key, func):
+        """Run func() once per key; returns (result, duplicate).
+
+        A duplicate's result is None when the first run's result was over
+        MAX_STORED_RESULT_BYTES. Callers that need it back should store large
+        results elsewhere and return a pointer to them from func().
+        """
+        if not self.table_name:
+            return func(), False
+
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                self.stats['cache_hits'] += 1
+                return self.cache[key], True
+
+        if not self.claim(key):
+            result = self.recorded_result(key)
+            self.remember(key, result)
+            with self.lock:
+                self.stats['store_hits'] += 1
+            return result, True
+
+        try:
+            result = func()
+        except Exception:
+            # Release the claim so the redelivery can try again.
+            self.client.delete_item(TableName=self.table_name, Key={'id': {'S': key}})
+            raise
+
+        self.complete(key, result)
+        self.remember(key, result)
+        with self.lock:
+            self.stats['executed'] += 1
+        return result, False
+
+    def claim(self, key):
+        now = int(time.time())
+        try:
+            self.client.put_item(
+                TableName=self.table_name,
+                Item={
+                    'id': {'S': key},
+                    'status': {'S': 'IN_PROGRESS'},
+                    'leaseExpiresAt': {'N': str(now + self.lease_seconds)},
+                    'expiresAt': {'N': str(now + self.ttl_seconds)}
+                },
+                # Free, or claimed by an attempt whose lease has run out (crashed or timed out).
+                ConditionExpression='attribute_not_exists(id) OR (#status = :in_progress AND leaseExpiresAt < :now)',
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues={':in_progress': {'S': 'IN_PROGRESS'}, ':now': {'N': str(now)}}
+            )
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return False
+            raise
+
+    def recorded_result(self, key):
+        item = self.client.get_item(
+            TableName=self.table_name,
+            Key={'id': {'S': key}},
+            ConsistentRead=True
+        ).get('Item')
+        if not item:
+            # Claim released between our put and get; let the redelivery retry.
+            raise DuplicateInProgress(key)
+        if item['status']['S'] != 'COMPLETED':
+            raise DuplicateInProgress(key)
+        return json.loads(item['result']['S']) if 'result' in item else None
+
+    def complete(self, key, result):
+        item = {
+            'id': {'S': key},
+            'status': {'S': 'COMPLETED'},
+            'expiresAt': {'N': str(int(time.time()) + self.ttl_seconds)}
+        }
+        encoded = json.dumps(result, default=str)
+        if len(encoded.encode('utf-8')) <= MAX_STORED_RESULT_BYTES:
+            item['result'] = {'S': encoded}
+        self.client.put_item(TableName=self.table_name, Item=item)
+
+    def remember(self, key, result):
+        with self.lock:
+            self.cache[key] = result
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
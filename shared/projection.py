@@ -0,0 +1,51 @@
+"""Field selection for DynamoDB reads (`fields=` parameters).
+
+Package this file next to the handler (`zip -j function.zip handler.py
+../shared/projection.py`) and turn the requested fields into request
+parameters and a response filter:
+
+    fields = parse_fields(event.get('fields'))
+    response = table.get_item(Key=key, **projection_params(fields))
+    body = project(response['Item'], fields)
+
+Fields are top-level attribute names. Every name goes through an
+ExpressionAttributeNames placeholder, so reserved words such as `name` or
+`status` need no special handling.
+"""
+
+MAX_FIELDS = 50
+
+def parse_fields(fields):
+    """'a,b' or ['a', 'b'] -> ['a', 'b']; None or '' -> None (all attributes).
+
+    Raises ValueError for anything else.
+    """
+    if fields is None or fields == '':
+        return None
+    if isinstance(fields, str):
+        fields = fields.split(',')
+    if not isinstance(fields, list) or not all(isinstance(field, str) for field in fields):
+        raise ValueError('fields must be a comma-separated string or a list of strings')
+
+    names = list(dict.fromkeys(field.strip() for field in fields if field.strip()))
+    if not names:
+        return None
+    if len(names) > MAX_FIELDS:
+        raise ValueError(f'At most {MAX_FIELDS} fields')
+    return names
+
+def projection_params(fields):
+    """ProjectionExpression and ExpressionAttributeNames for a read, or {} for all attributes."""
+    if not fields:
+        return {}
+    placeholders = {f'#f{i}': field for i, field in enumerate(fields)}
+    return {
+        'ProjectionExpression': ', '.join(placeholders),
+        'ExpressionAttributeNames': placeholders
+    }
+
+def project(item, fields):
+    """Keep only the requested attributes of an item (all of them when fields is None)."""
+    if not fields:
+        return item
+    return {field: item[field] for field in fields if field in item}
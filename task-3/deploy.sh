@@ -54,7 +54,7 @@ aws --profile $PROFILE iam list-attached-role-policies --role-name $ROLE_NAME
 echo ""
 
 echo "Step 7: Packaging test Lambda function..."
-zip test-function.zip test_permissions.py
+zip -j test-function.zip test_permissions.py ../shared/aws_clients.py
 echo "✓ Function packaged"
 echo ""
 
@@ -1,9 +1,8 @@
 import json
-import boto3
-import os
 
-endpoint_url = os.environ.get('AWS_ENDPOINT_URL', 'http://host.docker.internal:4566')
-s3 = boto3.client('s3', endpoint_url=endpoint_url)
+from aws_clients import client
+
+s3 = client('s3')
 
 def handler(event, context):
     bucket = 'processing-bucket'
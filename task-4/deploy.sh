@@ -35,7 +35,7 @@ echo "✓ Policy attached"
 echo ""
 
 echo "Step 4: Packaging Lambda function..."
-zip function.zip s3_processor.py
+zip -j function.zip s3_processor.py ../shared/aws_clients.py
 echo "✓ Function packaged"
 echo ""
 
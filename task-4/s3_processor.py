@@ -1,56 +1,342 @@
 import json
-import boto3
+import bz2
+import codecs
+import gzip
+import lzma
 import os
+import threading
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from itertools import repeat
 
-endpoint_url = os.environ.get('AWS_ENDPOINT_URL', 'http://host.docker.internal:4566')
-s3 = boto3.client('s3', endpoint_url=endpoint_url)
+from aws_clients import ENDPOINT_URL, client
+
+# Objects larger than this are processed in streaming mode (constant memory).
+# The in-memory path holds several copies of an object (bytes, text, its
+# uppercase copy, the JSON summary), so when records run concurrently each one
+# gets an equal share of this threshold instead. Set to 0 to stream everything.
+STREAM_THRESHOLD_BYTES = int(os.environ.get('STREAM_THRESHOLD_BYTES', str(16 * 1024 * 1024)))
+CHUNK_SIZE = 1024 * 1024
+# Multipart parts must be at least 5 MB, except the last one.
+PART_SIZE = 8 * 1024 * 1024
+# Records in one invocation are processed concurrently, up to this many at a time.
+MAX_WORKERS = int(os.environ.get('RECORD_MAX_WORKERS', '8'))
+s3 = client('s3', concurrency=MAX_WORKERS)
+
+# Compressed inputs are recognised by extension and always decompressed as a
+# stream, since their expanded size is unknown up front.
+DECOMPRESSORS = {
+    '.gz': lambda body: gzip.GzipFile(fileobj=body, mode='rb'),
+    '.bz2': bz2.BZ2File,
+    '.xz': lzma.LZMAFile,
+}
+
+# Encoding of the -processed summary: 'pretty' (indented JSON), 'json'
+# (compact), 'ndjson' (a single compact line) or 'json.gz' (compact, gzipped
+# and served with ContentEncoding: gzip).
+OUTPUT_FORMAT = os.environ.get('OUTPUT_FORMAT', 'pretty')
+OUTPUT_FORMATS = {
+    'pretty': {'extension': '.json', 'content_type': 'application/json'},
+    'json': {'extension': '.json', 'content_type': 'application/json'},
+    'ndjson': {'extension': '.ndjson', 'content_type': 'application/x-ndjson'},
+    'json.gz': {'extension': '.json', 'content_type': 'application/json', 'content_encoding': 'gzip'},
+}
+if OUTPUT_FORMAT not in OUTPUT_FORMATS:
+    raise ValueError(f"Unsupported OUTPUT_FORMAT: {OUTPUT_FORMAT}")
+# The in-memory summary embeds the original text next to its uppercase copy;
+# set to 'false' to keep only the uppercase copy.
+INCLUDE_ORIGINAL_CONTENT = os.environ.get('INCLUDE_ORIGINAL_CONTENT', 'true').lower() == 'true'
+
+# Re-uploads of identical content are recognised by the source ETag: a marker
+# under output/_dedup/ points at the result produced the first time.
+DEDUP_ENABLED = os.environ.get('DEDUP_ENABLED', 'true').lower() == 'true'
+DEDUP_PREFIX = 'output/_dedup/'
+dedup_stats = {'hits': 0, 'misses': 0}
+dedup_lock = threading.Lock()
 
 def handler(event, context):
     print(f"Received event: {json.dumps(event)}")
-    print(f"Using endpoint: {endpoint_url}")
+    print(f"Using endpoint: {ENDPOINT_URL}")
 
+    jobs = []
+    from_sqs = False
     for record in event['Records']:
-        bucket = record['s3']['bucket']['name']
+        if record.get('eventSource') == 'aws:sqs':
+            # S3 notifications delivered through an SQS queue: one message can
+            # wrap several S3 records and is retried as a unit.
+            from_sqs = True
+            notification = json.loads(record['body'])
+            for s3_record in notification.get('Records', []):
+                jobs.append((record['messageId'], s3_record))
+        else:
+            jobs.append((None, record))
+
+    workers = max(1, min(MAX_WORKERS, len(jobs)))
+    stream_threshold = STREAM_THRESHOLD_BYTES // workers
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        outcomes = list(executor.map(run_record, [record for _, record in jobs], repeat(stream_threshold)))
+
+    failures = [(job, error) for job, error in zip(jobs, outcomes) if error]
+    print(f"Processed {len(jobs) - len(failures)}/{len(jobs)} records, {len(failures)} failed")
+    if DEDUP_ENABLED:
+        print(f"Dedup stats: {dedup_stats}")
+
+    if from_sqs:
+        failed_ids = []
+        for (message_id, _), _ in failures:
+            if message_id not in failed_ids:
+                failed_ids.append(message_id)
+        return {'batchItemFailures': [{'itemIdentifier': m} for m in failed_ids]}
+
+    if failures:
+        # Direct S3 invocations have no partial-failure response; failing the
+        # invocation makes Lambda retry the event.
+        failed_keys = [record['s3']['object']['key'] for (_, record), _ in failures]
+        raise Exception(f"Failed to process {len(failures)} object(s): {failed_keys}")
+
+    return {
+        'statusCode': 200,
+        'body': json.dumps('Processing complete')
+    }
+
+def run_record(record, stream_threshold=STREAM_THRESHOLD_BYTES):
+    """Process one S3 record; return an error message, or None on success."""
+    try:
+        process_record(record, stream_threshold)
+        return None
+    except Exception as e:
         key = record['s3']['object']['key']
-        event_name = record['eventName']
+        print(f"Error processing {key}: {str(e)}")
+        return str(e)
+
+def process_record(record, stream_threshold=STREAM_THRESHOLD_BYTES):
+    bucket = record['s3']['bucket']['name']
+    key = record['s3']['object']['key']
+    event_name = record['eventName']
+
+    print(f"Processing {event_name} for {bucket}/{key}")
+
+    if not key.startswith('input/'):
+        print(f"Ignoring object not in input/: {key}")
+        return
+
+    compression = os.path.splitext(key)[1]
+    decompressor = DECOMPRESSORS.get(compression)
+    source_key = key[:-len(compression)] if decompressor else key
+
+    output_key, uppercase_key = output_keys(source_key)
+
+    etag = None
+    if DEDUP_ENABLED:
+        etag = record['s3']['object'].get('eTag') or s3.head_object(Bucket=bucket, Key=key)['ETag']
+        etag = etag.strip('"')
+        if reuse_previous_result(bucket, key, etag, output_key, uppercase_key):
+            count_dedup('hits')
+            return
+        count_dedup('misses')
 
-        print(f"Processing {event_name} for {bucket}/{key}")
+    response = s3.get_object(Bucket=bucket, Key=key)
 
-        if not key.startswith('input/'):
-            print(f"Ignoring object not in input/: {key}")
-            continue
+    if decompressor:
+        stream = decompressor(response['Body'])
+        chunks = iter(lambda: stream.read(CHUNK_SIZE), b'')
+        processed_content = process_streaming(bucket, key, uppercase_key, chunks)
+        processed_content['compression'] = compression[1:]
+    elif response['ContentLength'] > stream_threshold:
+        chunks = response['Body'].iter_chunks(chunk_size=CHUNK_SIZE)
+        processed_content = process_streaming(bucket, key, uppercase_key, chunks)
+    else:
+        content = response['Body'].read().decode('utf-8')
+        processed_content = {
+            'original_file': key,
+            'processed_at': datetime.utcnow().isoformat(),
+            'original_content': content,
+            'word_count': len(content.split()),
+            'character_count': len(content),
+            'uppercase_content': content.upper()
+        }
+        if not INCLUDE_ORIGINAL_CONTENT:
+            del processed_content['original_content']
 
-        try:
-            response = s3.get_object(Bucket=bucket, Key=key)
-            content = response['Body'].read().decode('utf-8')
+    if etag:
+        # Checked before a later upload reuses this result: output_key is
+        # rewritten whenever the source changes, so the marker alone can be stale.
+        processed_content['source_etag'] = etag
+    put_output(bucket, output_key, processed_content)
 
-            processed_content = {
-                'original_file': key,
-                'processed_at': datetime.utcnow().isoformat(),
-                'original_content': content,
-                'word_count': len(content.split()),
-                'character_count': len(content),
-                'uppercase_content': content.upper()
-            }
+    if etag:
+        s3.put_object(
+            Bucket=bucket,
+            Key=f"{DEDUP_PREFIX}{etag}.json",
+            Body=json.dumps({'source_key': key, 'output_key': output_key, 'output_format': OUTPUT_FORMAT}),
+            ContentType='application/json'
+        )
 
-            output_key = key.replace('input/', 'output/')
-            output_key = output_key.replace('.txt', '-processed.json')
+    print(f"Successfully processed {key} -> {output_key}")
 
-            s3.put_object(
-                Bucket=bucket,
-                Key=output_key,
-                Body=json.dumps(processed_content, indent=2),
-                ContentType='application/json'
-            )
+def reuse_previous_result(bucket, key, etag, output_key, uppercase_key):
+    """Write output_key from an earlier result for the same content, if any.
 
-            print(f"Successfully processed {key} -> {output_key}")
+    Returns False when there is no usable earlier result and the object
+    has to be processed in full.
+    """
+    try:
+        marker = s3.get_object(Bucket=bucket, Key=f"{DEDUP_PREFIX}{etag}.json")
+    except s3.exceptions.NoSuchKey:
+        return False
+    previous = json.loads(marker['Body'].read())
+    if previous.get('output_format', 'pretty') != OUTPUT_FORMAT:
+        return False
 
-        except Exception as e:
-            print(f"Error processing {key}: {str(e)}")
-            raise
+    try:
+        summary = decode_output(s3.get_object(Bucket=bucket, Key=previous['output_key'])['Body'].read())
+        if summary.get('source_etag') != etag:
+            # The earlier output has since been overwritten with other content.
+            return False
+
+        if previous['output_key'] == output_key:
+            print(f"Unchanged re-upload of {key}, {output_key} is current")
+        else:
+            # The counts carry over, but the summary is rewritten for this key.
+            # A streaming result's uppercase text is copied server-side.
+            summary['original_file'] = key
+            summary['processed_at'] = datetime.utcnow().isoformat()
+            summary['deduplicated_from'] = previous['source_key']
+            if 'uppercase_output' in summary:
+                s3.copy_object(
+                    Bucket=bucket,
+                    Key=uppercase_key,
+                    CopySource={'Bucket': bucket, 'Key': summary['uppercase_output']}
+                )
+                summary['uppercase_output'] = uppercase_key
+            put_output(bucket, output_key, summary)
+            print(f"Duplicate content for {key}, reused {previous['output_key']} -> {output_key}")
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+            # The earlier result is gone; recompute it.
+            return False
+        raise
+    return True
+
+def put_output(bucket, output_key, processed_content):
+    output_format = OUTPUT_FORMATS[OUTPUT_FORMAT]
+    put_params = {
+        'Bucket': bucket,
+        'Key': output_key,
+        'Body': encode_output(processed_content),
+        'ContentType': output_format['content_type']
+    }
+    if 'content_encoding' in output_format:
+        put_params['ContentEncoding'] = output_format['content_encoding']
+    s3.put_object(**put_params)
+
+def encode_output(processed_content):
+    if OUTPUT_FORMAT == 'pretty':
+        return json.dumps(processed_content, indent=2)
+    compact = json.dumps(processed_content, separators=(',', ':'), ensure_ascii=False)
+    if OUTPUT_FORMAT == 'ndjson':
+        return (compact + '\n').encode('utf-8')
+    if OUTPUT_FORMAT == 'json.gz':
+        return gzip.compress(compact.encode('utf-8'))
+    return compact.encode('utf-8')
+
+def decode_output(body):
+    """Inverse of encode_output()."""
+    if OUTPUT_FORMAT == 'json.gz':
+        body = gzip.decompress(body)
+    return json.loads(body)
+
+def output_keys(source_key):
+    """(summary key, uppercase text key) for an input/ key without its compression extension.
+
+    input/a.txt -> output/a-processed.json and output/a-uppercase.txt; other
+    names keep their extension (input/d -> output/d-processed.json), so the
+    two outputs never share a key.
+    """
+    base = 'output/' + source_key[len('input/'):]
+    if base.endswith('.txt'):
+        base = base[:-len('.txt')]
+    output_key = base + '-processed' + OUTPUT_FORMATS[OUTPUT_FORMAT]['extension']
+    uppercase_key = base + '-uppercase.txt'
+    assert output_key != uppercase_key, output_key
+    return output_key, uppercase_key
+
+def count_dedup(outcome):
+    with dedup_lock:
+        dedup_stats[outcome] += 1
+
+def process_streaming(bucket, key, uppercase_key, chunks):
+    """Count words/characters and upload the uppercase text chunk by chunk.
+
+    The uppercase content goes to its own object via a multipart upload, and
+    the returned summary references it instead of embedding any content.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    word_count = 0
+    character_count = 0
+    in_word = False
+
+    upload = s3.create_multipart_upload(
+        Bucket=bucket,
+        Key=uppercase_key,
+        ContentType='text/plain; charset=utf-8'
+    )
+    upload_id = upload['UploadId']
+    parts = []
+    buffer = bytearray()
+
+    try:
+        for raw in chunks:
+            # The incremental decoder holds back UTF-8 sequences split across chunks.
+            text = decoder.decode(raw)
+            if not text:
+                continue
+
+            character_count += len(text)
+            words = len(text.split())
+            # A word straddling the chunk boundary was already counted.
+            if in_word and words and not text[0].isspace():
+                words -= 1
+            word_count += words
+            in_word = not text[-1].isspace()
+
+            buffer += text.upper().encode('utf-8')
+            if len(buffer) >= PART_SIZE:
+                parts.append(upload_part(bucket, uppercase_key, upload_id, len(parts) + 1, buffer))
+                buffer = bytearray()
+
+        # Raises on a truncated trailing UTF-8 sequence, like bytes.decode().
+        decoder.decode(b'', final=True)
+
+        if buffer or not parts:
+            parts.append(upload_part(bucket, uppercase_key, upload_id, len(parts) + 1, buffer))
+
+        s3.complete_multipart_upload(
+            Bucket=bucket,
+            Key=uppercase_key,
+            UploadId=upload_id,
+            MultipartUpload={'Parts': parts}
+        )
+    except Exception:
+        s3.abort_multipart_upload(Bucket=bucket, Key=uppercase_key, UploadId=upload_id)
+        raise
 
     return {
-        'statusCode': 200,
-        'body': json.dumps('Processing complete')
+        'original_file': key,
+        'processed_at': datetime.utcnow().isoformat(),
+        'mode': 'streaming',
+        'word_count': word_count,
+        'character_count': character_count,
+        'uppercase_output': uppercase_key
     }
+
+def upload_part(bucket, key, upload_id, part_number, data):
+    result = s3.upload_part(
+        Bucket=bucket,
+        Key=key,
+        UploadId=upload_id,
+        PartNumber=part_number,
+        Body=bytes(data)
+    )
+    return {'ETag': result['ETag'], 'PartNumber': part_number}
@@ -0,0 +1,61 @@
+"""Dedup checks for s3_processor.py against LocalStack (or any endpoint in AWS_ENDPOINT_URL).
+
+    PYTHONPATH=../shared python test_dedup.py
+
+Each check invokes the handler directly with an S3 event for a fresh bucket.
+"""
+import json
+import os
+import uuid
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+import s3_processor
+from s3_processor import handler, s3
+
+def new_bucket():
+    bucket = f'dedup-test-{uuid.uuid4().hex[:12]}'
+    s3.create_bucket(Bucket=bucket)
+    return bucket
+
+def upload(bucket, key, text):
+    etag = s3.put_object(Bucket=bucket, Key=key, Body=text.encode('utf-8'))['ETag']
+    handler({'Records': [{
+        'eventName': 'ObjectCreated:Put',
+        's3': {'bucket': {'name': bucket}, 'object': {'key': key, 'eTag': etag}}
+    }]}, None)
+
+def summary(bucket, key):
+    return s3_processor.decode_output(s3.get_object(Bucket=bucket, Key=key)['Body'].read())
+
+def test_overwrite_then_revert():
+    bucket = new_bucket()
+    upload(bucket, 'input/a.txt', 'hello world')
+    upload(bucket, 'input/a.txt', 'other stuff here')
+    upload(bucket, 'input/a.txt', 'hello world')
+    assert summary(bucket, 'output/a-processed.json')['uppercase_content'] == 'HELLO WORLD'
+
+    # Same content under a new key reuses the reverted result, not the overwritten one.
+    upload(bucket, 'input/b.txt', 'hello world')
+    result = summary(bucket, 'output/b-processed.json')
+    assert result['uppercase_content'] == 'HELLO WORLD'
+    assert result['original_file'] == 'input/b.txt'
+
+def test_duplicate_reuses_result():
+    bucket = new_bucket()
+    upload(bucket, 'input/a.txt', 'hello world')
+    hits = s3_processor.dedup_stats['hits']
+    upload(bucket, 'input/b.txt', 'hello world')
+    assert s3_processor.dedup_stats['hits'] == hits + 1
+    assert summary(bucket, 'output/b-processed.json')['deduplicated_from'] == 'input/a.txt'
+
+if __name__ == '__main__':
+    results = {}
+    for name, check in [('overwrite_then_revert', test_overwrite_then_revert),
+                        ('duplicate_reuses_result', test_duplicate_reuses_result)]:
+        try:
+            check()
+            results[name] = 'PASSED'
+        except AssertionError as e:
+            results[name] = f'FAILED: {e!r}'
+    print(json.dumps(results, indent=2))
@@ -1,27 +1,66 @@
 import json
-import boto3
 import uuid
 import os
+import base64
+import time
+import zlib
+from collections import OrderedDict
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
-endpoint_url = os.environ.get("AWS_ENDPOINT_URL", "http://localhost:4566")
-s3 = boto3.client("s3", endpoint_url=endpoint_url)
+from api_response import response
+from aws_clients import client
+
 BUCKET = "api-data-store"
+ITEMS_PREFIX = "items/"
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+MAX_WORKERS = int(os.environ.get("LIST_MAX_WORKERS", "10"))
+s3 = client("s3", concurrency=MAX_WORKERS)
+
+# Optional manifest under items/_index/ so listings read a few shard objects
+# instead of one object per item.
+INDEX_MODE = os.environ.get("INDEX_MODE", "false").lower() == "true"
+INDEX_PREFIX = "items/_index/"
+INDEX_SHARDS = int(os.environ.get("INDEX_SHARDS", "16"))
+INDEX_MAX_ATTEMPTS = 5
+
+# Bulk endpoints: S3 DeleteObjects accepts at most 1000 keys per call.
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", "1000"))
+DELETE_OBJECTS_LIMIT = 1000
+
+# Warm-container read-through cache for get_item: item_id -> entry with the
+# parsed item, its S3 ETag and when it was last validated. Stale entries are
+# revalidated with a conditional GET instead of being downloaded again.
+CACHE_MAX_ITEMS = int(os.environ.get("ITEM_CACHE_MAX_ITEMS", "256"))
+CACHE_TTL_SECONDS = float(os.environ.get("ITEM_CACHE_TTL_SECONDS", "30"))
+item_cache = OrderedDict()
+cache_stats = {"hits": 0, "misses": 0, "revalidations": 0}
 
 
 def handler(event, context):
     print(f"Received event: {json.dumps(event)}")
 
+    if event.get("action") == "rebuild_index":
+        return rebuild_index()
+
     http_method = event["httpMethod"]
     path = event["path"]
     path_parameters = event.get("pathParameters") or {}
+    query_parameters = event.get("queryStringParameters") or {}
+    headers = {k.lower(): v for k, v in (event.get("headers") or {}).items()}
     body = event.get("body")
 
-    if http_method == "GET" and path == "/items":
-        return list_items()
+    if http_method == "POST" and path == "/items:batch":
+        return create_items_batch(body)
+    elif http_method == "DELETE" and path == "/items:batch":
+        return delete_items_batch(body)
+    elif http_method == "GET" and path == "/items":
+        return list_items(query_parameters.get("limit"), query_parameters.get("cursor"))
     elif http_method == "GET" and path.startswith("/items/"):
         item_id = path_parameters.get("id")
-        return get_item(item_id)
+        return get_item(item_id, headers.get("if-none-match"))
     elif http_method == "POST" and path == "/items":
         return create_item(body)
     elif http_method == "DELETE" and path.startswith("/items/"):
@@ -31,38 +70,158 @@ def handler(event, context):
         return response(404, {"error": "Not found"})
 
 
-def list_items():
+def list_items(limit=None, cursor=None):
+    try:
+        page_size = int(limit) if limit else DEFAULT_PAGE_SIZE
+    except ValueError:
+        return response(400, {"error": "Invalid limit"})
+    if page_size < 1 or page_size > MAX_PAGE_SIZE:
+        return response(400, {"error": f"limit must be between 1 and {MAX_PAGE_SIZE}"})
+
+    try:
+        start_after = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        return response(400, {"error": "Invalid cursor"})
+
     try:
-        result = s3.list_objects_v2(Bucket=BUCKET, Prefix="items/")
-        items = []
+        if INDEX_MODE:
+            return list_items_from_index(page_size, start_after)
+
+        params = {"Bucket": BUCKET, "Prefix": ITEMS_PREFIX, "MaxKeys": page_size}
+        if start_after:
+            params["StartAfter"] = start_after
+        result = s3.list_objects_v2(**params)
+
+        contents = result.get("Contents", [])
+        keys = [obj["Key"] for obj in contents if is_item_key(obj["Key"])]
+
+        # Fetch the page's item bodies concurrently; map() keeps key order.
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            items = [item for item in executor.map(fetch_item, keys) if item is not None]
 
-        if "Contents" in result:
-            for obj in result["Contents"]:
-                key = obj["Key"]
-                if key != "items/":
-                    item_data = s3.get_object(Bucket=BUCKET, Key=key)
-                    item = json.loads(item_data["Body"].read().decode("utf-8"))
-                    items.append(item)
+        next_cursor = None
+        if result.get("IsTruncated") and contents:
+            next_cursor = encode_cursor(contents[-1]["Key"])
 
-        return response(200, {"items": items, "count": len(items)})
+        return response(
+            200, {"items": items, "count": len(items), "next_cursor": next_cursor}
+        )
     except Exception as e:
         return response(500, {"error": str(e)})
 
 
-def get_item(item_id):
+def list_items_from_index(page_size, start_after):
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        shards = list(executor.map(read_index_shard, range(INDEX_SHARDS)))
+
+    entries = []
+    for shard, _ in shards:
+        entries.extend(shard["items"].values())
+    entries.sort(key=lambda entry: entry["id"])
+
+    if start_after:
+        entries = [e for e in entries if item_key(e["id"]) > start_after]
+
+    page = entries[:page_size]
+    next_cursor = None
+    if len(entries) > page_size:
+        next_cursor = encode_cursor(item_key(page[-1]["id"]))
+
+    return response(
+        200, {"items": page, "count": len(page), "next_cursor": next_cursor}
+    )
+
+
+def item_key(item_id):
+    return f"{ITEMS_PREFIX}{item_id}.json"
+
+
+def is_item_key(key):
+    return key != ITEMS_PREFIX and not key.startswith(INDEX_PREFIX)
+
+
+def fetch_item(key):
+    try:
+        item_data = s3.get_object(Bucket=BUCKET, Key=key)
+    except s3.exceptions.NoSuchKey:
+        # Deleted between the LIST and the GET.
+        return None
+    return json.loads(item_data["Body"].read().decode("utf-8"))
+
+
+def encode_cursor(key):
+    return base64.urlsafe_b64encode(key.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    try:
+        key = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+    except (ValueError, UnicodeError):
+        raise ValueError("Invalid cursor")
+    if not key.startswith(ITEMS_PREFIX):
+        raise ValueError("Invalid cursor")
+    return key
+
+
+def get_item(item_id, if_none_match=None):
     if not item_id:
         return response(400, {"error": "Missing item ID"})
 
     try:
-        key = f"items/{item_id}.json"
-        result = s3.get_object(Bucket=BUCKET, Key=key)
-        item = json.loads(result["Body"].read().decode("utf-8"))
-        return response(200, item)
+        item, etag, cache_status = get_cached_item(item_id)
     except s3.exceptions.NoSuchKey:
         return response(404, {"error": "Item not found"})
     except Exception as e:
         return response(500, {"error": str(e)})
 
+    print(f"Item cache {cache_status} for {item_id}: {cache_stats}")
+    headers = {"ETag": etag, "X-Cache": cache_status}
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return response(304, None, headers)
+    return response(200, item, headers)
+
+
+def get_cached_item(item_id):
+    """Return (item, etag, cache_status), going to S3 only when needed."""
+    key = f"items/{item_id}.json"
+    entry = item_cache.get(item_id)
+
+    if entry and time.monotonic() - entry["validated_at"] < CACHE_TTL_SECONDS:
+        item_cache.move_to_end(item_id)
+        cache_stats["hits"] += 1
+        return entry["item"], entry["etag"], "HIT"
+
+    params = {"Bucket": BUCKET, "Key": key}
+    if entry:
+        params["IfNoneMatch"] = entry["etag"]
+
+    try:
+        result = s3.get_object(**params)
+    except ClientError as e:
+        if entry and e.response["Error"]["Code"] in ("304", "NotModified"):
+            entry["validated_at"] = time.monotonic()
+            item_cache.move_to_end(item_id)
+            cache_stats["revalidations"] += 1
+            return entry["item"], entry["etag"], "REVALIDATED"
+        item_cache.pop(item_id, None)
+        raise
+
+    item = json.loads(result["Body"].read().decode("utf-8"))
+    cache_item(item_id, item, result["ETag"])
+    cache_stats["misses"] += 1
+    return item, result["ETag"], "MISS"
+
+
+def cache_item(item_id, item, etag):
+    item_cache[item_id] = {
+        "item": item,
+        "etag": etag,
+        "validated_at": time.monotonic(),
+    }
+    item_cache.move_to_end(item_id)
+    while len(item_cache) > CACHE_MAX_ITEMS:
+        item_cache.popitem(last=False)
+
 
 def create_item(body):
     if not body:
@@ -70,22 +229,11 @@ def create_item(body):
 
     try:
         data = json.loads(body)
-        item_id = str(uuid.uuid4())
+        item = new_item(data)
+        put_item(item)
 
-        item = {
-            "id": item_id,
-            "name": data.get("name", "Unnamed"),
-            "description": data.get("description", ""),
-            "created_at": datetime.utcnow().isoformat(),
-        }
-
-        key = f"items/{item_id}.json"
-        s3.put_object(
-            Bucket=BUCKET,
-            Key=key,
-            Body=json.dumps(item),
-            ContentType="application/json",
-        )
+        if INDEX_MODE:
+            sync_index({item["id"]: index_entry(item)})
 
         return response(201, item)
     except json.JSONDecodeError:
@@ -94,6 +242,24 @@ def create_item(body):
         return response(500, {"error": str(e)})
 
 
+def new_item(data):
+    return {
+        "id": str(uuid.uuid4()),
+        "name": data.get("name", "Unnamed"),
+        "description": data.get("description", ""),
+        "created_at": datetime.utcnow().isoformat(),
+    }
+
+
+def put_item(item):
+    s3.put_object(
+        Bucket=BUCKET,
+        Key=item_key(item["id"]),
+        Body=json.dumps(item),
+        ContentType="application/json",
+    )
+
+
 def delete_item(item_id):
     if not item_id:
         return response(400, {"error": "Missing item ID"})
@@ -102,6 +268,11 @@ def delete_item(item_id):
         key = f"items/{item_id}.json"
         s3.head_object(Bucket=BUCKET, Key=key)
         s3.delete_object(Bucket=BUCKET, Key=key)
+        item_cache.pop(item_id, None)
+
+        if INDEX_MODE:
+            sync_index({item_id: None})
+
         return response(200, {"message": "Item deleted", "id": item_id})
     except s3.exceptions.ClientError as e:
         if e.response["Error"]["Code"] == "404":
@@ -111,12 +282,269 @@ def delete_item(item_id):
         return response(500, {"error": str(e)})
 
 
-def response(status_code, body):
-    return {
-        "statusCode": status_code,
-        "headers": {
-            "Content-Type": "application/json",
-            "Access-Control-Allow-Origin": "*",
+def parse_batch(body, field):
+    """Return the list under `field` in a batch request body, or an error response."""
+    if not body:
+        return None, response(400, {"error": "Missing request body"})
+    try:
+        entries = json.loads(body).get(field)
+    except (json.JSONDecodeError, AttributeError):
+        return None, response(400, {"error": "Invalid JSON"})
+    if not isinstance(entries, list) or not entries:
+        return None, response(400, {"error": f"'{field}' must be a non-empty list"})
+    if len(entries) > MAX_BATCH_SIZE:
+        return None, response(
+            400, {"error": f"At most {MAX_BATCH_SIZE} {field} per request"}
+        )
+    return entries, None
+
+
+def batch_response(results):
+    failed = sum(1 for result in results if result["status"] >= 400)
+    return response(
+        200,
+        {
+            "results": results,
+            "count": len(results),
+            "succeeded": len(results) - failed,
+            "failed": failed,
         },
-        "body": json.dumps(body),
+    )
+
+
+def create_items_batch(body):
+    entries, error = parse_batch(body, "items")
+    if error:
+        return error
+
+    def create_one(entry):
+        if not isinstance(entry, dict):
+            return {"status": 400, "error": "Item must be a JSON object"}
+        item = new_item(entry)
+        try:
+            put_item(item)
+        except Exception as e:
+            return {"status": 500, "error": str(e)}
+        return {"status": 201, "item": item}
+
+    try:
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            results = list(executor.map(create_one, entries))
+
+        if INDEX_MODE:
+            sync_index(
+                {
+                    r["item"]["id"]: index_entry(r["item"])
+                    for r in results
+                    if r["status"] == 201
+                }
+            )
+
+        return batch_response(results)
+    except Exception as e:
+        return response(500, {"error": str(e)})
+
+
+def delete_items_batch(body):
+    ids, error = parse_batch(body, "ids")
+    if error:
+        return error
+
+    valid_ids = list(dict.fromkeys(i for i in ids if is_valid_item_id(i)))
+    results = {}
+
+    try:
+        # Same existence check as DELETE /items/{id}: DeleteObjects alone
+        # reports ids with no object as deleted.
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            found = list(executor.map(head_item, valid_ids))
+        deletable = []
+        for item_id, (exists, error) in zip(valid_ids, found):
+            if error:
+                results[item_id] = {"id": item_id, "status": 500, "error": error}
+            elif not exists:
+                results[item_id] = {"id": item_id, "status": 404, "error": "Item not found"}
+            else:
+                deletable.append(item_id)
+
+        for start in range(0, len(deletable), DELETE_OBJECTS_LIMIT):
+            chunk = deletable[start : start + DELETE_OBJECTS_LIMIT]
+            result = s3.delete_objects(
+                Bucket=BUCKET,
+                Delete={"Objects": [{"Key": item_key(i)} for i in chunk]},
+            )
+            for deleted in result.get("Deleted", []):
+                item_id = item_id_from_key(deleted["Key"])
+                results[item_id] = {"id": item_id, "status": 200}
+                item_cache.pop(item_id, None)
+            for failed in result.get("Errors", []):
+                item_id = item_id_from_key(failed["Key"])
+                results[item_id] = {
+                    "id": item_id,
+                    "status": 500,
+                    "error": f"{failed.get('Code')}: {failed.get('Message')}",
+                }
+
+        if INDEX_MODE:
+            sync_index(
+                {i: None for i, r in results.items() if r["status"] == 200}
+            )
+
+        ordered = []
+        for item_id in ids:
+            if not is_valid_item_id(item_id):
+                ordered.append({"id": item_id, "status": 400, "error": "Invalid item ID"})
+            else:
+                ordered.append(
+                    results.get(
+                        item_id, {"id": item_id, "status": 500, "error": "No result from S3"}
+                    )
+                )
+        return batch_response(ordered)
+    except Exception as e:
+        return response(500, {"error": str(e)})
+
+
+def head_item(item_id):
+    """(exists, error) for one item, from a HEAD request."""
+    try:
+        s3.head_object(Bucket=BUCKET, Key=item_key(item_id))
+        return True, None
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+            return False, None
+        return False, str(e)
+
+
+def is_valid_item_id(item_id):
+    return isinstance(item_id, str) and item_id != "" and "/" not in item_id
+
+
+def item_id_from_key(key):
+    return key[len(ITEMS_PREFIX) : -len(".json")]
+
+
+def index_entry(item):
+    return {
+        "id": item["id"],
+        "name": item.get("name", "Unnamed"),
+        "created_at": item.get("created_at"),
+    }
+
+
+def index_shard_key(shard):
+    return f"{INDEX_PREFIX}shard-{shard:03d}.json"
+
+
+def shard_for(item_id):
+    return zlib.crc32(item_id.encode("utf-8")) % INDEX_SHARDS
+
+
+def read_index_shard(shard):
+    """Return (manifest, etag); etag is None when the shard does not exist yet."""
+    try:
+        result = s3.get_object(Bucket=BUCKET, Key=index_shard_key(shard))
+    except s3.exceptions.NoSuchKey:
+        return {"version": 0, "items": {}}, None
+    manifest = json.loads(result["Body"].read().decode("utf-8"))
+    return manifest, result["ETag"]
+
+
+def write_index_shard(shard, manifest, etag=None):
+    params = {
+        "Bucket": BUCKET,
+        "Key": index_shard_key(shard),
+        "Body": json.dumps(manifest, separators=(",", ":")),
+        "ContentType": "application/json",
     }
+    if etag:
+        params["IfMatch"] = etag
+    else:
+        params["IfNoneMatch"] = "*"
+    s3.put_object(**params)
+
+
+def sync_index(changes):
+    """update_index_entries() after the items were written; never raises.
+
+    The item writes have already succeeded, so an index failure must not turn
+    the response into a 500. It is logged and rebuild_index repairs it.
+    """
+    try:
+        update_index_entries(changes)
+    except Exception as e:
+        print(
+            f"Index update for {len(changes)} items failed, "
+            f"run rebuild_index to repair: {str(e)}"
+        )
+
+
+def update_index_entries(changes):
+    """Apply {item_id: entry or None} to the manifest, one write per shard.
+
+    Uses a conditional write on each shard's ETag and re-reads on conflict,
+    so concurrent writers never overwrite each other's changes.
+    """
+    by_shard = {}
+    for item_id, entry in changes.items():
+        by_shard.setdefault(shard_for(item_id), {})[item_id] = entry
+
+    for shard, shard_changes in by_shard.items():
+        update_index_shard(shard, shard_changes)
+
+
+def update_index_shard(shard, shard_changes):
+    for attempt in range(INDEX_MAX_ATTEMPTS):
+        manifest, etag = read_index_shard(shard)
+        changed = False
+        for item_id, entry in shard_changes.items():
+            if entry is None:
+                changed |= manifest["items"].pop(item_id, None) is not None
+            else:
+                manifest["items"][item_id] = entry
+                changed = True
+        if not changed:
+            return
+        manifest["version"] = manifest.get("version", 0) + 1
+
+        try:
+            write_index_shard(shard, manifest, etag)
+            return
+        except ClientError as e:
+            code = e.response["Error"]["Code"]
+            if code not in ("PreconditionFailed", "ConditionalRequestConflict"):
+                raise
+            time.sleep(0.05 * (2**attempt))
+
+    # The items themselves are already written; rebuild_index repairs the manifest.
+    print(
+        f"Index update for shard {shard} ({len(shard_changes)} items) "
+        f"gave up after {INDEX_MAX_ATTEMPTS} attempts"
+    )
+
+
+def rebuild_index():
+    """Regenerate every manifest shard from a full scan of items/."""
+    try:
+        keys = []
+        paginator = s3.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=BUCKET, Prefix=ITEMS_PREFIX):
+            keys.extend(
+                obj["Key"] for obj in page.get("Contents", []) if is_item_key(obj["Key"])
+            )
+
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            items = [item for item in executor.map(fetch_item, keys) if item is not None]
+
+        shards = [{} for _ in range(INDEX_SHARDS)]
+        for item in items:
+            shards[shard_for(item["id"])][item["id"]] = index_entry(item)
+
+        for shard, entries in enumerate(shards):
+            previous, etag = read_index_shard(shard)
+            manifest = {"version": previous.get("version", 0) + 1, "items": entries}
+            write_index_shard(shard, manifest, etag)
+
+        return response(200, {"message": "Index rebuilt", "count": len(items)})
+    except Exception as e:
+        return response(500, {"error": str(e)})
@@ -33,7 +33,7 @@ echo "✓ Role and policy created"
 echo ""
 
 echo "Step 3: Packaging and deploying Lambda function..."
-zip function.zip api_handler.py
+zip -j function.zip api_handler.py ../shared/api_response.py ../shared/aws_clients.py
 
 aws --profile $PROFILE lambda create-function \
   --function-name $FUNCTION_NAME \
@@ -77,6 +77,13 @@ ITEM_RESOURCE_ID=$(aws --profile $PROFILE apigateway create-resource \
   --path-part '{id}' \
   --query 'id' --output text)
 echo "✓ Item resource ID: $ITEM_RESOURCE_ID"
+
+BATCH_RESOURCE_ID=$(aws --profile $PROFILE apigateway create-resource \
+  --rest-api-id $API_ID \
+  --parent-id $ROOT_ID \
+  --path-part 'items:batch' \
+  --query 'id' --output text)
+echo "✓ Batch resource ID: $BATCH_RESOURCE_ID"
 echo ""
 
 echo "Step 8: Creating methods..."
@@ -105,6 +112,14 @@ aws --profile $PROFILE apigateway put-method \
   --http-method DELETE \
   --authorization-type NONE \
   --request-parameters method.request.path.id=true
+
+for METHOD in POST DELETE; do
+  aws --profile $PROFILE apigateway put-method \
+    --rest-api-id $API_ID \
+    --resource-id $BATCH_RESOURCE_ID \
+    --http-method $METHOD \
+    --authorization-type NONE
+done
 echo "✓ Methods created"
 echo ""
 
@@ -142,6 +157,16 @@ aws --profile $PROFILE apigateway put-integration \
   --type AWS_PROXY \
   --integration-http-method POST \
   --uri "arn:aws:apigateway:us-east-1:lambda:path/2015-03-31/functions/$LAMBDA_ARN/invocations"
+
+for METHOD in POST DELETE; do
+  aws --profile $PROFILE apigateway put-integration \
+    --rest-api-id $API_ID \
+    --resource-id $BATCH_RESOURCE_ID \
+    --http-method $METHOD \
+    --type AWS_PROXY \
+    --integration-http-method POST \
+    --uri "arn:aws:apigateway:us-east-1:lambda:path/2015-03-31/functions/$LAMBDA_ARN/invocations"
+done
 echo "✓ Integrations configured"
 echo ""
 
@@ -209,3 +234,5 @@ echo "  GET    $BASE_URL/items"
 echo "  POST   $BASE_URL/items"
 echo "  GET    $BASE_URL/items/{id}"
 echo "  DELETE $BASE_URL/items/{id}"
+echo "  POST   $BASE_URL/items:batch"
+echo "  DELETE $BASE_URL/items:batch"
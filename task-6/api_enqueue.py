@@ -1,12 +1,19 @@
 import json
-import boto3
 import os
+import time
 import uuid
 
-endpoint_url = os.environ.get('AWS_ENDPOINT_URL', 'http://localhost:4566')
-sqs = boto3.client('sqs', endpoint_url=endpoint_url)
+from aws_clients import client
+
+sqs = client('sqs')
 QUEUE_URL = os.environ.get('QUEUE_URL', 'http://localhost:4566/000000000000/task-queue')
 
+# SQS limits for SendMessageBatch: 10 entries and 256 KB of message bodies per call.
+BATCH_MAX_ENTRIES = 10
+BATCH_MAX_BYTES = 256 * 1024
+MAX_TASKS_PER_REQUEST = int(os.environ.get('MAX_TASKS_PER_REQUEST', '1000'))
+MAX_SEND_ATTEMPTS = 3
+
 def handler(event, context):
     print(f"Received request: {json.dumps(event)}")
 
@@ -16,6 +23,13 @@ def handler(event, context):
 
     try:
         data = json.loads(body)
+
+        if not isinstance(data, (dict, list)):
+            return response(400, {'error': 'Request body must be a JSON object or a list of tasks'})
+        if isinstance(data, list) or 'tasks' in data:
+            tasks = data if isinstance(data, list) else data['tasks']
+            return enqueue_batch(tasks)
+
         task_type = data.get('task_type')
         task_data = data.get('data', {})
 
@@ -44,6 +58,91 @@ def handler(event, context):
     except Exception as e:
         return response(500, {'error': str(e)})
 
+def enqueue_batch(tasks):
+    """Queue a list of tasks with SendMessageBatch; one result per task, in order."""
+    if not isinstance(tasks, list) or not tasks:
+        return response(400, {'error': 'tasks must be a non-empty list'})
+    if len(tasks) > MAX_TASKS_PER_REQUEST:
+        return response(400, {'error': f'At most {MAX_TASKS_PER_REQUEST} tasks per request'})
+
+    results = [None] * len(tasks)
+    pending = []
+    for index, task in enumerate(tasks):
+        if not isinstance(task, dict):
+            results[index] = {'index': index, 'error': 'Task must be a JSON object'}
+            continue
+        if not task.get('task_type'):
+            results[index] = {'index': index, 'error': 'Missing task_type'}
+            continue
+
+        message_body = json.dumps({
+            'task_type': task['task_type'],
+            'data': task.get('data', {}),
+            'submitted_at': task.get('submitted_at')
+        })
+        if len(message_body.encode('utf-8')) > BATCH_MAX_BYTES:
+            results[index] = {'index': index, 'error': 'Task exceeds the 256 KB message limit'}
+            continue
+        pending.append((index, message_body))
+
+    for attempt in range(MAX_SEND_ATTEMPTS):
+        if not pending:
+            break
+        if attempt:
+            time.sleep(0.1 * (2 ** attempt))
+
+        retry = []
+        for chunk in pack_batches(pending):
+            entries = [{'Id': str(index), 'MessageBody': message_body} for index, message_body in chunk]
+            try:
+                result = sqs.send_message_batch(QueueUrl=QUEUE_URL, Entries=entries)
+            except Exception as e:
+                # The whole call failed (throttling, network): retry every entry.
+                print(f"send_message_batch failed: {str(e)}")
+                retry.extend(chunk)
+                for index, _ in chunk:
+                    results[index] = {'index': index, 'error': str(e)}
+                continue
+
+            bodies = dict(chunk)
+            for success in result.get('Successful', []):
+                index = int(success['Id'])
+                results[index] = {
+                    'index': index,
+                    'message_id': success['MessageId'],
+                    'task_type': tasks[index]['task_type']
+                }
+            for failure in result.get('Failed', []):
+                index = int(failure['Id'])
+                results[index] = {'index': index, 'error': f"{failure['Code']}: {failure.get('Message', '')}"}
+                # Sender faults (bad input) will fail again; only retry service-side errors.
+                if not failure.get('SenderFault'):
+                    retry.append((index, bodies[index]))
+        pending = retry
+
+    queued = sum(1 for result in results if 'message_id' in result)
+    return response(202, {
+        'message': f'Queued {queued} of {len(tasks)} tasks',
+        'queued': queued,
+        'failed': len(tasks) - queued,
+        'results': results
+    })
+
+def pack_batches(entries):
+    """Group (index, body) pairs into batches within the SQS entry and size limits."""
+    batch = []
+    batch_bytes = 0
+    for index, message_body in entries:
+        size = len(message_body.encode('utf-8'))
+        if batch and (len(batch) == BATCH_MAX_ENTRIES or batch_bytes + size > BATCH_MAX_BYTES):
+            yield batch
+            batch = []
+            batch_bytes = 0
+        batch.append((index, message_body))
+        batch_bytes += size
+    if batch:
+        yield batch
+
 def response(status_code, body):
     return {
         'statusCode': status_code,
@@ -1,9 +1,9 @@
 import json
-import boto3
 import os
 
-endpoint_url = os.environ.get('AWS_ENDPOINT_URL', 'http://localstack:4566')
-sqs = boto3.client('sqs', endpoint_url=endpoint_url)
+from aws_clients import client
+
+sqs = client('sqs')
 
 def handler(event, context):
     print(f"Received request: {json.dumps(event)}")
@@ -63,7 +63,7 @@ echo "✓ Processor role created"
 echo ""
 
 echo "Step 5: Deploying task processor Lambda..."
-zip function.zip task_processor.py
+zip -j function.zip task_processor.py ../shared/idempotency.py ../shared/aws_clients.py
 
 aws --profile $PROFILE lambda create-function \
   --function-name task-processor \
@@ -84,7 +84,8 @@ aws --profile $PROFILE lambda create-event-source-mapping \
   --function-name task-processor \
   --event-source-arn $QUEUE_ARN \
   --batch-size 5 \
-  --maximum-batching-window-in-seconds 10
+  --maximum-batching-window-in-seconds 10 \
+  --function-response-types ReportBatchItemFailures
 echo "✓ Event source mapping created"
 echo ""
 
@@ -104,7 +105,7 @@ echo "✓ API role created"
 echo ""
 
 echo "Step 8: Deploying API Lambda..."
-zip api-function.zip api_enqueue.py
+zip -j api-function.zip api_enqueue.py ../shared/aws_clients.py
 
 aws --profile $PROFILE lambda create-function \
   --function-name api-enqueue \
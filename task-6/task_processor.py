@@ -1,70 +1,513 @@
+import gzip
 import json
-import boto3
+import math
+import multiprocessing
+import operator
 import os
+import random
+import threading
 import time
+import uuid
+from array import array
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
+from itertools import repeat
+
+from aws_clients import client
+from idempotency import MAX_STORED_RESULT_BYTES, IdempotencyGuard
+
+try:
+    import numpy as np
+except ImportError:
+    # Not in the default Lambda runtime; add it via a layer for large arrays.
+    np = None
+
+# compute_statistics reduces its buffer in blocks of this many values, small
+# enough to stay in cache while each block's aggregates are taken.
+STATS_BLOCK_SIZE = 64 * 1024
 
-endpoint_url = os.environ.get('AWS_ENDPOINT_URL', 'http://localhost:4566')
-s3 = boto3.client('s3', endpoint_url=endpoint_url)
 BUCKET = 'task-results'
 
-def handler(event, context):
-    print(f"Processing {len(event['Records'])} messages")
+# Stop waiting this long before the Lambda timeout so the partial batch
+# response still gets returned; unfinished messages are reported as failed.
+DEADLINE_MARGIN_MS = int(os.environ.get('DEADLINE_MARGIN_MS', '5000'))
 
-    for record in event['Records']:
-        message_id = record['messageId']
-        body = json.loads(record['body'])
+# RESULTS_MODE=segment writes all results of one invocation as a single NDJSON
+# object under results/segments/ instead of one results/{message_id}.json
+# each. The SEGMENT_INDEX_TABLE (partition key message_id) maps every
+# message_id to its segment and byte range, written with BatchWriteItem once
+# per invocation, so read_segment_result() fetches one result with a ranged
+# GET. With SEGMENT_GZIP=true every line is its own gzip member, so a range is
+# still a complete gzip stream and the whole segment still decompresses with zcat.
+RESULTS_MODE = os.environ.get('RESULTS_MODE', 'object')
+SEGMENT_GZIP = os.environ.get('SEGMENT_GZIP', 'false').lower() == 'true'
+SEGMENT_PREFIX = 'results/segments/'
+SEGMENT_INDEX_TABLE = os.environ.get('SEGMENT_INDEX_TABLE', 'ResultSegments')
+# BatchWriteItem takes at most 25 items per call.
+BATCH_WRITE_CHUNK_SIZE = 25
+MAX_BATCH_WRITE_ATTEMPTS = 8
+
+# Task type registry: name -> TaskType. Every type has its own pool of
+# max_concurrency threads, and the handler hands each message straight to its
+# type's pool, so a backlog of one type never holds the threads of another.
+# The executor picks where the task itself runs:
+#   'inline'  - on the type's pool thread
+#   'thread'  - on the type's pool thread, and fails if it runs past timeout
+#               (seconds); a thread cannot be pre-empted, so this is checked
+#               when the task returns
+#   'process' - in a child process (from a fork server), killed at timeout, so
+#               CPU-bound work does not hold the GIL while other types wait
+TASK_TYPES = {}
+LATENCY_BUCKETS = [0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
 
-        print(f"Processing message {message_id}: {body}")
+class TaskType:
+    def __init__(self, name, func, executor, max_concurrency, timeout):
+        if executor not in ('inline', 'thread', 'process'):
+            raise ValueError(f"Unknown executor for task type {name}: {executor}")
+        self.name = name
+        self.func = func
+        self.executor = executor
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix=f'task-{name}')
+        self.lock = threading.Lock()
+        self.completed = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        # Per-bucket counts, one per LATENCY_BUCKETS upper bound plus one for
+        # +Inf; metrics() reports them cumulatively.
+        self.histogram = [0] * (len(LATENCY_BUCKETS) + 1)
 
+    def run(self, data):
+        started = time.monotonic()
+        ok = False
         try:
-            task_type = body.get('task_type')
-            task_data = body.get('data', {})
-
-            if task_type == 'compute':
-                result = process_compute_task(task_data)
-            elif task_type == 'transform':
-                result = process_transform_task(task_data)
-            elif task_type == 'fail':
-                raise Exception("Simulated failure for testing DLQ")
+            # Called on one of self.pool's threads, which caps the concurrency.
+            if self.executor == 'process':
+                result = run_in_process(self.func, data, self.timeout)
             else:
-                raise ValueError(f"Unknown task type: {task_type}")
+                result = self.func(data)
+                if self.executor == 'thread' and self.timeout is not None \
+                        and time.monotonic() - started > self.timeout:
+                    raise TimeoutError(f"{self.name} task exceeded {self.timeout}s")
+            ok = True
+            return result
+        finally:
+            self.record(time.monotonic() - started, ok)
 
-            result['message_id'] = message_id
-            result['processed_at'] = datetime.utcnow().isoformat()
+    def record(self, seconds, ok):
+        with self.lock:
+            self.completed += 1
+            if not ok:
+                self.errors += 1
+            self.total_seconds += seconds
+            self.histogram[bisect_left(LATENCY_BUCKETS, seconds)] += 1
 
-            result_key = f"results/{message_id}.json"
-            s3.put_object(
-                Bucket=BUCKET,
-                Key=result_key,
-                Body=json.dumps(result, indent=2),
-                ContentType='application/json'
-            )
+    def metrics(self):
+        with self.lock:
+            # Cumulative, as le_ implies: le_1 counts every task that took at most 1s.
+            buckets = {}
+            running = 0
+            for bound, count in zip(LATENCY_BUCKETS + [math.inf], self.histogram):
+                running += count
+                buckets[f'le_{bound:g}'] = running
+            return {
+                'executor': self.executor,
+                'completed': self.completed,
+                'errors': self.errors,
+                'mean_seconds': self.total_seconds / self.completed if self.completed else None,
+                'tasks_per_busy_second': self.completed / self.total_seconds if self.total_seconds else None,
+                'latency_histogram': buckets
+            }
+
+def register_task_type(name, executor='thread', max_concurrency=4, timeout=None):
+    """Decorator adding a task handler `func(data) -> dict` to TASK_TYPES."""
+    def decorator(func):
+        TASK_TYPES[name] = TaskType(name, func, executor, max_concurrency, timeout)
+        return func
+    return decorator
+
+def process_context():
+    """forkserver context whose server has this module preloaded.
+
+    Tasks run from the task types' pool threads, and forking a multi-threaded
+    process can leave the child stuck on a lock another thread held (the S3
+    client's connection pool, logging, ...). The fork server is a separate
+    single-threaded process: children fork from it, and importing this module
+    there once keeps each start cheap.
+    """
+    context = multiprocessing.get_context('forkserver')
+    # The server inherits the environment but not sys.path (Lambda adds the
+    # task root to sys.path at runtime), so without this the preload fails
+    # quietly and every child imports the module again.
+    module_dir = os.path.dirname(os.path.abspath(__file__))
+    paths = [path for path in os.environ.get('PYTHONPATH', '').split(os.pathsep) if path]
+    if module_dir not in paths:
+        os.environ['PYTHONPATH'] = os.pathsep.join([module_dir] + paths)
+    context.set_forkserver_preload([__name__])
+    return context
+
+def run_in_process(func, data, timeout):
+    # A plain Process + Pipe rather than ProcessPoolExecutor: Lambda has no
+    # /dev/shm, which multiprocessing queues and pools depend on. `func`
+    # (by name) and `data` are pickled to the child; the result comes back
+    # the same way.
+    context = process_context()
+    receiver, sender = context.Pipe(duplex=False)
+    child = context.Process(target=process_entrypoint, args=(func, data, sender), daemon=True)
+    child.start()
+    sender.close()
+    try:
+        if not receiver.poll(timeout):
+            child.terminate()
+            raise TimeoutError(f"{func.__name__} exceeded {timeout}s")
+        try:
+            ok, payload = receiver.recv()
+        except EOFError:
+            raise RuntimeError(f"{func.__name__} worker exited with code {child.exitcode}")
+    finally:
+        receiver.close()
+        child.join()
+    if not ok:
+        raise RuntimeError(payload)
+    return payload
+
+def process_entrypoint(func, data, sender):
+    try:
+        sender.send((True, func(data)))
+    except Exception as e:
+        sender.send((False, f"{type(e).__name__}: {e}"))
+    finally:
+        sender.close()
 
-            print(f"Successfully processed {message_id} -> {result_key}")
+def task_metrics():
+    return {name: task_type.metrics() for name, task_type in TASK_TYPES.items()}
 
+def handler(event, context):
+    records = event['Records']
+    print(f"Processing {len(records)} messages")
+
+    deadline = None
+    if context is not None:
+        deadline = time.monotonic() + (context.get_remaining_time_in_millis() - DEADLINE_MARGIN_MS) / 1000
+
+    coalesce = RESULTS_MODE == 'segment'
+    failed = []
+    futures = {}
+    for record in records:
+        message_id = record['messageId']
+        try:
+            task_type, task_data = parse_message(record)
         except Exception as e:
             print(f"Error processing message {message_id}: {str(e)}")
-            raise
+            failed.append(message_id)
+            continue
+        future = task_type.pool.submit(process_message, record, task_type, task_data, deadline, not coalesce)
+        futures[future] = message_id
+
+    timeout = max(0, deadline - time.monotonic()) if deadline is not None else None
+    done, not_done = wait(futures, timeout=timeout)
+    # Don't block on stragglers; SQS redelivers them after the visibility timeout.
+    # Those still queued are dropped, running ones finish in the background.
+    for future in not_done:
+        future.cancel()
+
+    results = []
+    for future, message_id in futures.items():
+        if future not in done:
+            print(f"Message {message_id} did not finish before the deadline")
+            failed.append(message_id)
+        elif future.exception() is not None:
+            failed.append(message_id)
+        elif future.result() is not None:
+            results.append(future.result())
 
+    if coalesce and results:
+        try:
+            write_segment(results)
+        except Exception as e:
+            print(f"Error writing result segment: {str(e)}")
+            failed.extend(result['message_id'] for result in results)
+
+    print(f"Processed {len(records) - len(failed)}/{len(records)} messages, {len(failed)} failed")
+    print(f"Task metrics: {json.dumps(task_metrics())}")
+    if idempotency.table_name:
+        print(f"Idempotency stats: {idempotency.stats}")
+
+    # Requires ReportBatchItemFailures on the event source mapping.
     return {
-        'statusCode': 200,
-        'body': json.dumps(f'Processed {len(event["Records"])} messages')
+        'batchItemFailures': [{'itemIdentifier': message_id} for message_id in failed]
     }
 
+def parse_message(record):
+    """(TaskType, data) for an SQS record; raises for a malformed message."""
+    body = json.loads(record['body'])
+    print(f"Processing message {record['messageId']}: {body}")
+
+    task_type = body.get('task_type')
+    if task_type not in TASK_TYPES:
+        raise ValueError(f"Unknown task type: {task_type}")
+    return TASK_TYPES[task_type], body.get('data', {})
+
+def process_message(record, task_type, task_data, deadline=None, write_result=True):
+    message_id = record['messageId']
+
+    try:
+        if deadline is not None and time.monotonic() > deadline:
+            raise TimeoutError("Deadline passed before the message was started")
+
+        def execute():
+            result = task_type.run(task_data)
+            result['message_id'] = message_id
+            result['processed_at'] = datetime.utcnow().isoformat()
+
+            if write_result:
+                s3.put_object(
+                    Bucket=BUCKET,
+                    Key=f"results/{message_id}.json",
+                    Body=json.dumps(result, indent=2),
+                    ContentType='application/json'
+                )
+                return result
+
+            encoded = json.dumps(result, separators=(',', ':')).encode('utf-8')
+            if len(encoded) > MAX_STORED_RESULT_BYTES:
+                # Too large to record with the idempotency key, so a redelivery
+                # would have nothing to put in its segment. Store it on its own
+                # and let the segment carry a pointer.
+                s3.put_object(
+                    Bucket=BUCKET,
+                    Key=f"results/{message_id}.json",
+                    Body=encoded,
+                    ContentType='application/json'
+                )
+                return {
+                    'message_id': message_id,
+                    'processed_at': result['processed_at'],
+                    'result_key': f"results/{message_id}.json"
+                }
+            return result
+
+        # SQS redeliveries of a finished message return the recorded result
+        # without redoing the task or its S3 write.
+        result, duplicate = idempotency.run(f"task-processor#{message_id}", execute)
+
+        if duplicate:
+            print(f"Skipped duplicate delivery of {message_id}")
+            if result is None:
+                # Recorded without a body; the first delivery already stored it.
+                return None
+        elif write_result:
+            print(f"Successfully processed {message_id} -> results/{message_id}.json")
+        else:
+            print(f"Successfully processed {message_id}")
+        return result
+
+    except Exception as e:
+        print(f"Error processing message {message_id}: {str(e)}")
+        raise
+
+def write_segment(results):
+    """Write results as one NDJSON segment and index each one's byte range."""
+    segment_id = f"{datetime.utcnow():%Y/%m/%d/%H%M%S}-{uuid.uuid4().hex}"
+    segment_key = f"{SEGMENT_PREFIX}{segment_id}.ndjson" + ('.gz' if SEGMENT_GZIP else '')
+
+    body = bytearray()
+    ranges = {}
+    for result in results:
+        line = (json.dumps(result, separators=(',', ':')) + '\n').encode('utf-8')
+        if SEGMENT_GZIP:
+            line = gzip.compress(line)
+        ranges[result['message_id']] = (len(body), len(line))
+        body += line
+
+    s3.put_object(
+        Bucket=BUCKET,
+        Key=segment_key,
+        Body=bytes(body),
+        ContentType='application/x-ndjson'
+    )
+    write_segment_index(segment_key, ranges)
+    print(f"Wrote {len(results)} results -> {segment_key}")
+    return segment_key
+
+def write_segment_index(segment_key, ranges):
+    """Record message_id -> (segment, offset, length), retrying UnprocessedItems with backoff."""
+    requests = [
+        {'PutRequest': {'Item': {
+            'message_id': {'S': message_id},
+            'segment': {'S': segment_key},
+            'offset': {'N': str(offset)},
+            'length': {'N': str(length)},
+            'gzip': {'BOOL': SEGMENT_GZIP}
+        }}}
+        for message_id, (offset, length) in ranges.items()
+    ]
+    for start in range(0, len(requests), BATCH_WRITE_CHUNK_SIZE):
+        pending = requests[start:start + BATCH_WRITE_CHUNK_SIZE]
+        for attempt in range(MAX_BATCH_WRITE_ATTEMPTS):
+            if attempt:
+                # Exponential backoff with full jitter, capped at ~2.5 seconds.
+                time.sleep(random.uniform(0, min(2.5, 0.05 * (2 ** attempt))))
+            result = dynamodb.batch_write_item(RequestItems={SEGMENT_INDEX_TABLE: pending})
+            pending = result.get('UnprocessedItems', {}).get(SEGMENT_INDEX_TABLE)
+            if not pending:
+                break
+        else:
+            raise RuntimeError(
+                f"{len(pending)} segment index entries still unprocessed after {MAX_BATCH_WRITE_ATTEMPTS} attempts"
+            )
+
+def read_segment_result(message_id):
+    """Fetch one segment-mode result with a ranged GET; None if it is not indexed."""
+    item = dynamodb.get_item(
+        TableName=SEGMENT_INDEX_TABLE,
+        Key={'message_id': {'S': message_id}}
+    ).get('Item')
+    if not item:
+        return None
+    offset = int(item['offset']['N'])
+    end = offset + int(item['length']['N']) - 1
+    data = s3.get_object(
+        Bucket=BUCKET,
+        Key=item['segment']['S'],
+        Range=f"bytes={offset}-{end}"
+    )['Body'].read()
+    if item['gzip']['BOOL']:
+        data = gzip.decompress(data)
+    result = json.loads(data)
+    if 'result_key' in result:
+        # Too large for the segment, so it was stored on its own (see process_message).
+        result = json.loads(s3.get_object(Bucket=BUCKET, Key=result['result_key'])['Body'].read())
+    return result
+
+# The simulated 2s wait dominates compute tasks, so they default to threads;
+# COMPUTE_EXECUTOR=process moves the statistics off the GIL for huge inputs.
+@register_task_type('compute', executor=os.environ.get('COMPUTE_EXECUTOR', 'thread'), max_concurrency=8, timeout=60)
 def process_compute_task(data):
     numbers = data.get('numbers', [])
+    percentiles = data.get('percentiles', [])
     time.sleep(2)
 
+    result = {'task_type': 'compute'}
+    if data.get('include_input', True):
+        result['input'] = numbers
+    result.update(compute_statistics(numbers, percentiles))
+    return result
+
+def compute_statistics(numbers, percentiles=()):
+    """Summary statistics over a compact typed buffer, in one blocked pass.
+
+    The numbers are parsed once into int64 values (when all are integers) or
+    float64 values, with NumPy when it is installed and array otherwise. Each
+    block of STATS_BLOCK_SIZE values is reduced while it is in cache and merged
+    into running totals, so the buffer is read once; percentiles also sort a
+    copy. Integer input keeps integer sum, min and max.
+    """
+    for p in percentiles:
+        if not 0 <= p <= 100:
+            raise ValueError(f"Percentile out of range: {p}")
+
+    values, integral = to_buffer(numbers)
+    count = len(values)
+    if count == 0:
+        return {
+            'count': 0,
+            'sum': 0,
+            'average': 0,
+            'max': None,
+            'min': None,
+            'variance': None,
+            'stddev': None,
+            'percentiles': {}
+        }
+
+    sums = []
+    minimum = maximum = None
+    seen = 0
+    mean = 0.0
+    m2 = 0.0
+    for start in range(0, count, STATS_BLOCK_SIZE):
+        block = values[start:start + STATS_BLOCK_SIZE]
+        block_sum, block_min, block_max, block_m2 = reduce_block(block, integral)
+        size = len(block)
+        sums.append(block_sum)
+        minimum = block_min if minimum is None else min(minimum, block_min)
+        maximum = block_max if maximum is None else max(maximum, block_max)
+        # Merge the block's mean and squared deviations into the running ones
+        # (Chan et al.), which avoids the cancellation of sum(x^2) - n*mean^2.
+        delta = block_sum / size - mean
+        total_seen = seen + size
+        mean += delta * size / total_seen
+        m2 += block_m2 + delta * delta * seen * size / total_seen
+        seen = total_seen
+
+    total = sum(sums) if integral else math.fsum(sums)
+    variance = m2 / count
+
+    percentile_values = []
+    if percentiles:
+        ordered = np.sort(values) if np is not None else sorted(values)
+        percentile_values = [float(interpolate_percentile(ordered, p)) for p in percentiles]
+
     return {
-        'task_type': 'compute',
-        'input': numbers,
-        'sum': sum(numbers),
-        'average': sum(numbers) / len(numbers) if numbers else 0,
-        'max': max(numbers) if numbers else None,
-        'min': min(numbers) if numbers else None
+        'count': count,
+        'sum': total,
+        'average': total / count,
+        'max': maximum,
+        'min': minimum,
+        'variance': variance,
+        'stddev': math.sqrt(variance),
+        'percentiles': {f'p{p:g}': v for p, v in zip(percentiles, percentile_values)}
     }
 
+def to_buffer(numbers):
+    """(values, integral): int64 values when every number is an integer, else float64.
+
+    Both paths accept the same input: ints, floats and booleans. Strings,
+    None and nested lists raise TypeError.
+    """
+    if np is not None:
+        values = np.asarray(numbers)
+        if values.ndim == 1 and values.dtype.kind in 'biu' and values.dtype != np.uint64:
+            return values.astype(np.int64, copy=False), True
+        if values.ndim == 1 and values.dtype.kind == 'f':
+            return values.astype(np.float64, copy=False), False
+        # Strings, None or integers beyond int64: the same checks as array('d').
+        return np.frombuffer(float_array(numbers), dtype=np.float64), False
+    try:
+        return array('q', numbers), True
+    except (TypeError, OverflowError):
+        return float_array(numbers), False
+
+def float_array(numbers):
+    try:
+        return array('d', numbers)
+    except TypeError as e:
+        raise TypeError(f"numbers must be a list of numbers: {e}") from None
+
+def reduce_block(block, integral):
+    """(sum, min, max, sum of squared deviations from the block mean) of one block."""
+    if np is not None:
+        block_sum = int(block.sum()) if integral else float(block.sum())
+        deviations = block - block_sum / len(block)
+        minimum, maximum = block.min(), block.max()
+        minimum, maximum = (int(minimum), int(maximum)) if integral else (float(minimum), float(maximum))
+        return block_sum, minimum, maximum, float(np.dot(deviations, deviations))
+    block_sum = sum(block) if integral else math.fsum(block)
+    mean = block_sum / len(block)
+    m2 = math.fsum(map(operator.pow, map((-mean).__add__, block), repeat(2)))
+    return block_sum, min(block), max(block), m2
+
+def interpolate_percentile(ordered, p):
+    """Linear interpolation between closest ranks (NumPy's default method)."""
+    rank = (len(ordered) - 1) * p / 100
+    lower = math.floor(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+@register_task_type('transform', executor='thread', max_concurrency=8, timeout=30)
 def process_transform_task(data):
     text = data.get('text', '')
     time.sleep(1)
@@ -77,3 +520,15 @@ def process_transform_task(data):
         'word_count': len(text.split()),
         'char_count': len(text)
     }
+
+@register_task_type('fail', executor='inline', max_concurrency=8)
+def process_fail_task(data):
+    raise Exception("Simulated failure for testing DLQ")
+
+# Messages are processed end to end (idempotency check, task, S3 write) on
+# their task type's pool, so the clients are sized for all pools together.
+DISPATCH_CONCURRENCY = sum(task_type.max_concurrency for task_type in TASK_TYPES.values())
+s3 = client('s3', concurrency=DISPATCH_CONCURRENCY)
+dynamodb = client('dynamodb')
+# Set IDEMPOTENCY_TABLE to skip work for messages that were already processed.
+idempotency = IdempotencyGuard(os.environ.get('IDEMPOTENCY_TABLE'), concurrency=DISPATCH_CONCURRENCY)
@@ -1,11 +1,10 @@
 import json
-import boto3
 import time
-import os
 from datetime import datetime
 
-endpoint_url = os.environ.get('AWS_ENDPOINT_URL', 'http://localstack:4566')
-s3 = boto3.client('s3', endpoint_url=endpoint_url)
+from aws_clients import client
+
+s3 = client('s3')
 BUCKET = 'task-results'
 
 def handler(event, context):
@@ -1,16 +1,21 @@
 import json
+import os
 import random
 
+# Simulated outcomes; set RANDOM_SEED for reproducible runs.
+rng = random.Random(os.environ.get('RANDOM_SEED'))
+AVAILABILITY_RATE = float(os.environ.get('AVAILABILITY_RATE', '0.8'))
+
 def lambda_handler(event, context):
     """Check inventory availability (simulated)."""
     order_id = event.get('orderId')
 
-    available = random.random() < 0.8
+    available = rng.random() < AVAILABILITY_RATE
 
     return {
         'orderId': order_id,
         'amount': event.get('amount'),
         'customerId': event.get('customerId'),
         'inventoryAvailable': available,
-        'stockLevel': random.randint(0, 100) if available else 0
+        'stockLevel': rng.randint(0, 100) if available else 0
     }
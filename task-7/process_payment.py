@@ -1,20 +1,60 @@
 import json
+import os
 import random
 
+# Simulated outcomes; set RANDOM_SEED for reproducible runs.
+rng = random.Random(os.environ.get('RANDOM_SEED'))
+PAYMENT_SUCCESS_RATE = float(os.environ.get('PAYMENT_SUCCESS_RATE', '0.9'))
+
 def lambda_handler(event, context):
-    """Process payment (simulated)."""
+    """Process payment (simulated).
+
+    `action` selects the step: 'charge' (default) takes the payment in one
+    go. The parallel workflow instead runs 'authorize' alongside the
+    inventory check, then 'capture' or 'void' once both branches have joined.
+    """
+    action = event.get('action', 'charge')
     order_id = event.get('orderId')
     amount = event.get('amount')
 
-    success = random.random() < 0.9
+    if action == 'capture':
+        return {
+            'orderId': order_id,
+            'amount': amount,
+            'customerId': event.get('customerId'),
+            'paymentStatus': 'completed',
+            'authorizationId': event['authorizationId'],
+            'transactionId': f'txn-{order_id}-{rng.randint(1000, 9999)}'
+        }
+
+    if action == 'void':
+        return {
+            'orderId': order_id,
+            'paymentStatus': 'voided',
+            'authorizationId': event['authorizationId']
+        }
+
+    if action not in ('charge', 'authorize'):
+        raise ValueError(f'Unknown payment action: {action}')
+
+    success = rng.random() < PAYMENT_SUCCESS_RATE
 
     if not success:
         raise Exception('Payment processing failed')
 
+    if action == 'authorize':
+        return {
+            'orderId': order_id,
+            'amount': amount,
+            'customerId': event.get('customerId'),
+            'paymentStatus': 'authorized',
+            'authorizationId': f'auth-{order_id}-{rng.randint(1000, 9999)}'
+        }
+
     return {
         'orderId': order_id,
         'amount': amount,
         'customerId': event.get('customerId'),
         'paymentStatus': 'completed',
-        'transactionId': f'txn-{order_id}-{random.randint(1000, 9999)}'
+        'transactionId': f'txn-{order_id}-{rng.randint(1000, 9999)}'
     }
@@ -1,7 +1,16 @@
 import json
 
 def lambda_handler(event, context):
-    """Validate order data."""
+    """Validate order data.
+
+    A list of orders (or {"orders": [...]}) is validated in one invocation and
+    comes back split into validOrders and invalidOrders; a single order gets
+    the same response as before.
+    """
+    if isinstance(event, list) or 'orders' in event:
+        orders = event if isinstance(event, list) else event['orders']
+        return validate_batch(orders)
+
     order_id = event.get('orderId')
     amount = event.get('amount', 0)
     customer_id = event.get('customerId')
@@ -27,3 +36,47 @@ def lambda_handler(event, context):
         'amount': amount,
         'customerId': customer_id
     }
+
+def validate_batch(orders):
+    """Run the single-order checks over every order in one pass."""
+    if not isinstance(orders, list):
+        return {'statusCode': 400, 'error': 'orders must be a list'}
+
+    valid_orders = []
+    invalid_orders = []
+    for index, order in enumerate(orders):
+        # Same precedence and messages as the single-order checks.
+        if not isinstance(order, dict):
+            invalid_orders.append({'index': index, 'orderId': None, 'error': 'Order must be an object'})
+            continue
+
+        order_id = order.get('orderId')
+        customer_id = order.get('customerId')
+        amount = order.get('amount', 0)
+
+        if not order_id or not customer_id:
+            error = 'Missing required fields'
+        elif not is_positive_number(amount):
+            error = 'Invalid amount'
+        else:
+            valid_orders.append({
+                'index': index,
+                'orderId': order_id,
+                'amount': amount,
+                'customerId': customer_id
+            })
+            continue
+        invalid_orders.append({'index': index, 'orderId': order_id, 'error': error})
+
+    return {
+        'statusCode': 200,
+        'count': len(orders),
+        'validCount': len(valid_orders),
+        'invalidCount': len(invalid_orders),
+        'validOrders': valid_orders,
+        'invalidOrders': invalid_orders
+    }
+
+def is_positive_number(value):
+    # Booleans are ints, and NaN compares False.
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and value > 0
@@ -1,16 +1,54 @@
+import base64
 import json
 import os
-import boto3
+import random
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
-endpoint_url = os.environ.get('AWS_ENDPOINT_URL', 'http://localhost:4566')
-dynamodb = boto3.resource('dynamodb', endpoint_url=endpoint_url)
-table = dynamodb.Table('Users')
+from api_response import dumps, response
+from aws_clients import client, resource, table as lazy_table
+from projection import parse_fields, project, projection_params
+
+# Warm-container cache for READ and FIND_BY_EMAIL, kept current by the writes
+# this function makes: user_cache maps userId -> item and email_cache maps
+# email -> userId, each entry stamped with when it was cached. Changes made
+# by other containers or clients show up once an entry is older than the TTL.
+CACHE_MAX_USERS = int(os.environ.get('USER_CACHE_MAX_ITEMS', '1024'))
+CACHE_TTL_SECONDS = float(os.environ.get('USER_CACHE_TTL_SECONDS', '30'))
+user_cache = OrderedDict()
+email_cache = OrderedDict()
+cache_stats = {'hits': 0, 'misses': 0, 'email_hits': 0, 'email_misses': 0}
+
+# Batch actions take at most this many users per invocation.
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', '1000'))
+# BatchGetItem reads at most 100 keys per call.
+BATCH_GET_CHUNK_SIZE = 100
+MAX_BATCH_GET_ATTEMPTS = 8
+
+DEFAULT_LIST_LIMIT = 100
+MAX_LIST_LIMIT = 1000
+
+# EXPORT runs a parallel scan, one worker per segment, and writes each
+# segment to its own NDJSON object under exports/<exportId>/.
+EXPORT_BUCKET = os.environ.get('EXPORT_BUCKET', 'user-exports')
+EXPORT_SEGMENTS = int(os.environ.get('EXPORT_SEGMENTS', '4'))
+MAX_EXPORT_SEGMENTS = 32
+# Multipart parts must be at least 5 MB, except the last one.
+PART_SIZE = 8 * 1024 * 1024
+
+# EXPORT scans and uploads from one thread per segment.
+dynamodb = resource('dynamodb', concurrency=MAX_EXPORT_SEGMENTS, json_numbers=True)
+table = lazy_table('Users', json_numbers=True)
+s3 = client('s3', concurrency=MAX_EXPORT_SEGMENTS)
 
 def lambda_handler(event, context):
     """
     User management Lambda function.
-    Supports: CREATE, READ, UPDATE, DELETE, LIST operations
+    Supports: CREATE, READ, UPDATE, DELETE, LIST, FIND_BY_EMAIL, EXPORT,
+    BATCH_CREATE, BATCH_READ, BATCH_DELETE operations
     """
 
     action = event.get('action')
@@ -28,21 +66,35 @@ def lambda_handler(event, context):
             return list_users(event)
         elif action == 'FIND_BY_EMAIL':
             return find_by_email(event)
+        elif action == 'EXPORT':
+            return export_users(event)
+        elif action == 'BATCH_CREATE':
+            return batch_create_users(event)
+        elif action == 'BATCH_READ':
+            return batch_read_users(event)
+        elif action == 'BATCH_DELETE':
+            return batch_delete_users(event)
         else:
-            return {
-                'statusCode': 400,
-                'body': json.dumps({'error': 'Invalid action'})
-            }
+            return response(400, {'error': 'Invalid action'})
     except Exception as e:
-        return {
-            'statusCode': 500,
-            'body': json.dumps({'error': str(e)})
-        }
+        return response(500, {'error': str(e)})
 
 def create_user(event):
     """Create a new user."""
     data = event.get('data', {})
 
+    item = new_user_item(data)
+
+    table.put_item(Item=item)
+    cache_user(item)
+
+    return response(201, {
+        'message': 'User created',
+        'user': item
+    })
+
+def new_user_item(data):
+    """Build the stored item; raises KeyError for a missing required field."""
     item = {
         'userId': data['userId'],
         'email': data['email'],
@@ -55,32 +107,38 @@ def create_user(event):
     if 'role' in data:
         item['role'] = data['role']
 
-    table.put_item(Item=item)
-
-    return {
-        'statusCode': 201,
-        'body': json.dumps({
-            'message': 'User created',
-            'user': item
-        })
-    }
+    return item
 
 def read_user(event):
     """Get user by ID."""
     user_id = event.get('userId')
+    fields, error = requested_fields(event)
+    if error:
+        return error
 
-    response = table.get_item(Key={'userId': user_id})
+    item = cached_user(user_id)
+    if item is not None:
+        cache_stats['hits'] += 1
+    else:
+        cache_stats['misses'] += 1
+        result = table.get_item(Key={'userId': user_id}, **projection_params(fields))
 
-    if 'Item' not in response:
-        return {
-            'statusCode': 404,
-            'body': json.dumps({'error': 'User not found'})
-        }
+        if 'Item' not in result:
+            return response(404, {'error': 'User not found'})
+        item = result['Item']
+        # Partial items would answer later full reads wrongly.
+        if not fields:
+            cache_user(item)
 
-    return {
-        'statusCode': 200,
-        'body': json.dumps(response['Item'], default=str)
-    }
+    print(f"User cache: {cache_metrics()}")
+    return response(200, project(item, fields))
+
+def requested_fields(event):
+    """Parse the optional `fields` selection; returns (fields, error response)."""
+    try:
+        return parse_fields(event.get('fields')), None
+    except ValueError as e:
+        return None, response(400, {'error': str(e)})
 
 def update_user(event):
     """Update user attributes."""
@@ -102,62 +160,381 @@ def update_user(event):
         expr_names[attr_name] = key
         expr_values[attr_value] = value
 
-    response = table.update_item(
+    result = table.update_item(
         Key={'userId': user_id},
         UpdateExpression=update_expr,
         ExpressionAttributeNames=expr_names,
         ExpressionAttributeValues=expr_values,
         ReturnValues='ALL_NEW'
     )
+    # Also drops the old email mapping if the email changed.
+    cache_user(result['Attributes'])
 
-    return {
-        'statusCode': 200,
-        'body': json.dumps({
-            'message': 'User updated',
-            'user': response['Attributes']
-        }, default=str)
-    }
+    return response(200, {
+        'message': 'User updated',
+        'user': result['Attributes']
+    })
 
 def delete_user(event):
     """Delete user by ID."""
     user_id = event.get('userId')
 
     table.delete_item(Key={'userId': user_id})
+    evict_user(user_id)
 
-    return {
-        'statusCode': 200,
-        'body': json.dumps({'message': 'User deleted'})
-    }
+    return response(200, {'message': 'User deleted'})
 
 def list_users(event):
-    """List all users (scan operation)."""
-    response = table.scan()
-
-    return {
-        'statusCode': 200,
-        'body': json.dumps({
-            'count': response['Count'],
-            'users': response['Items']
-        }, default=str)
+    """List users a page at a time (scan operation).
+
+    `limit` caps the page size (default 100, max 1000). Pass the returned
+    `next_cursor` back as `cursor` for the next page; it is null on the last.
+    """
+    fields, error = requested_fields(event)
+    if error:
+        return error
+    try:
+        limit = int(event.get('limit', DEFAULT_LIST_LIMIT))
+        start_key = decode_cursor(event['cursor']) if event.get('cursor') else None
+    except (TypeError, ValueError):
+        return response(400, {'error': 'Invalid limit or cursor'})
+    limit = max(1, min(limit, MAX_LIST_LIMIT))
+
+    users = []
+    # A scan page stops at 1 MB even if Limit is not reached; keep reading.
+    while len(users) < limit:
+        scan_params = {'Limit': limit - len(users), **projection_params(fields)}
+        if start_key:
+            scan_params['ExclusiveStartKey'] = start_key
+        result = table.scan(**scan_params)
+        users.extend(result['Items'])
+        start_key = result.get('LastEvaluatedKey')
+        if not start_key:
+            break
+
+    return response(200, {
+        'count': len(users),
+        'users': users,
+        'next_cursor': encode_cursor(start_key) if start_key else None
+    })
+
+def batch_entries(event, field):
+    """Return the list under `field`, or an error response."""
+    entries = event.get(field)
+    if not isinstance(entries, list) or not entries:
+        return None, response(400, {'error': f"'{field}' must be a non-empty list"})
+    if len(entries) > MAX_BATCH_SIZE:
+        return None, response(400, {'error': f'At most {MAX_BATCH_SIZE} {field} per request'})
+    return entries, None
+
+def batch_response(results):
+    failed = sum(1 for result in results if result['status'] >= 400)
+    return response(200, {
+        'results': results,
+        'count': len(results),
+        'succeeded': len(results) - failed,
+        'failed': failed
+    })
+
+def batch_create_users(event):
+    """Create many users; {"users": [data, ...]} with the same fields as CREATE."""
+    users, error = batch_entries(event, 'users')
+    if error:
+        return error
+
+    results = []
+    items = []
+    seen = set()
+    for index, data in enumerate(users):
+        if not isinstance(data, dict):
+            results.append({'index': index, 'userId': None, 'status': 400, 'error': 'User must be an object'})
+            continue
+        user_id = data.get('userId')
+        try:
+            item = new_user_item(data)
+        except KeyError as e:
+            results.append({'index': index, 'userId': user_id, 'status': 400,
+                            'error': f'Missing required field: {e.args[0]}'})
+            continue
+        except (TypeError, ValueError) as e:
+            results.append({'index': index, 'userId': user_id, 'status': 400, 'error': f'Invalid user: {e}'})
+            continue
+        if item['userId'] in seen:
+            # BatchWriteItem rejects a request that writes the same key twice.
+            results.append({'index': index, 'userId': user_id, 'status': 409, 'error': 'Duplicate userId in batch'})
+            continue
+        seen.add(item['userId'])
+        items.append(item)
+        results.append({'index': index, 'userId': user_id, 'status': 201})
+
+    # batch_writer sends 25 items per BatchWriteItem call and resubmits
+    # UnprocessedItems until every item is written.
+    with table.batch_writer() as writer:
+        for item in items:
+            writer.put_item(Item=item)
+    for item in items:
+        cache_user(item)
+
+    return batch_response(results)
+
+def batch_delete_users(event):
+    """Delete many users; {"userIds": [...]}. Deleting a missing user succeeds, as in DELETE."""
+    user_ids, error = batch_entries(event, 'userIds')
+    if error:
+        return error
+
+    results = []
+    keys = []
+    for index, user_id in enumerate(user_ids):
+        if not isinstance(user_id, str) or not user_id:
+            results.append({'index': index, 'userId': user_id, 'status': 400, 'error': 'Invalid userId'})
+            continue
+        keys.append(user_id)
+        results.append({'index': index, 'userId': user_id, 'status': 200})
+
+    # BatchWriteItem rejects a request that touches the same key twice.
+    with table.batch_writer() as writer:
+        for user_id in dict.fromkeys(keys):
+            writer.delete_item(Key={'userId': user_id})
+    for user_id in keys:
+        evict_user(user_id)
+
+    return batch_response(results)
+
+def batch_read_users(event):
+    """Read many users by ID; {"userIds": [...]}, one result per requested ID."""
+    user_ids, error = batch_entries(event, 'userIds')
+    if error:
+        return error
+
+    # BatchGetItem rejects duplicate keys in one request.
+    keys = list(dict.fromkeys(user_id for user_id in user_ids if isinstance(user_id, str) and user_id))
+    found = {}
+    unprocessed = set()
+    for start in range(0, len(keys), BATCH_GET_CHUNK_SIZE):
+        chunk = keys[start:start + BATCH_GET_CHUNK_SIZE]
+        items, missed = batch_get_users(chunk)
+        found.update((item['userId'], item) for item in items)
+        unprocessed.update(missed)
+
+    results = []
+    for index, user_id in enumerate(user_ids):
+        if not isinstance(user_id, str) or not user_id:
+            results.append({'index': index, 'userId': user_id, 'status': 400, 'error': 'Invalid userId'})
+        elif user_id in found:
+            results.append({'index': index, 'userId': user_id, 'status': 200, 'user': found[user_id]})
+        elif user_id in unprocessed:
+            results.append({'index': index, 'userId': user_id, 'status': 503, 'error': 'Read throttled, retry later'})
+        else:
+            results.append({'index': index, 'userId': user_id, 'status': 404, 'error': 'User not found'})
+
+    return batch_response(results)
+
+def batch_get_users(user_ids):
+    """BatchGetItem up to 100 users, retrying UnprocessedKeys with backoff.
+
+    Returns (items, user IDs still unprocessed after the last attempt).
+    """
+    request = {table.name: {'Keys': [{'userId': user_id} for user_id in user_ids]}}
+    items = []
+    for attempt in range(MAX_BATCH_GET_ATTEMPTS):
+        if attempt:
+            # Exponential backoff with full jitter, capped at ~2.5 seconds.
+            time.sleep(random.uniform(0, min(2.5, 0.05 * (2 ** attempt))))
+        result = dynamodb.batch_get_item(RequestItems=request)
+        items.extend(result['Responses'].get(table.name, []))
+        request = result.get('UnprocessedKeys')
+        if not request:
+            return items, []
+    return items, [key['userId'] for key in request[table.name]['Keys']]
+
+def encode_cursor(last_evaluated_key):
+    return base64.urlsafe_b64encode(json.dumps(last_evaluated_key).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    key = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    if not isinstance(key, dict):
+        raise ValueError('Invalid cursor')
+    return key
+
+def export_users(event):
+    """Export every user to S3 as NDJSON using a parallel scan."""
+    bucket = event.get('bucket', EXPORT_BUCKET)
+    try:
+        segments = int(event.get('segments', EXPORT_SEGMENTS))
+    except (TypeError, ValueError):
+        segments = 0
+    if not 1 <= segments <= MAX_EXPORT_SEGMENTS:
+        return response(400, {'error': f'segments must be between 1 and {MAX_EXPORT_SEGMENTS}'})
+
+    export_id = event.get('exportId') or f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    prefix = f'exports/{export_id}/'
+
+    with ThreadPoolExecutor(max_workers=segments) as executor:
+        results = list(executor.map(
+            lambda segment: export_segment(bucket, prefix, segment, segments),
+            range(segments)
+        ))
+
+    manifest = {
+        'exportId': export_id,
+        'table': table.name,
+        'exportedAt': datetime.utcnow().isoformat(),
+        'count': sum(result['count'] for result in results),
+        'segments': results
     }
+    s3.put_object(
+        Bucket=bucket,
+        Key=f'{prefix}manifest.json',
+        Body=json.dumps(manifest, indent=2),
+        ContentType='application/json'
+    )
+
+    return response(200, {
+        'message': 'Users exported',
+        'bucket': bucket,
+        'manifest': f'{prefix}manifest.json',
+        'count': manifest['count']
+    })
+
+def export_segment(bucket, prefix, segment, total_segments):
+    """Scan one segment and stream its users to S3, one JSON object per line."""
+    key = f'{prefix}segment-{segment:04d}.ndjson'
+    # The resource's client is thread-safe (the Table resource is not) and,
+    # like the Table, returns items as plain Python values.
+    paginator = dynamodb.meta.client.get_paginator('scan')
+    buffer = bytearray()
+    parts = []
+    upload_id = None
+    count = 0
+
+    try:
+        for page in paginator.paginate(TableName=table.name, Segment=segment, TotalSegments=total_segments):
+            for item in page['Items']:
+                buffer += (dumps(item) + '\n').encode('utf-8')
+                count += 1
+
+            if len(buffer) >= PART_SIZE:
+                if upload_id is None:
+                    upload_id = s3.create_multipart_upload(
+                        Bucket=bucket,
+                        Key=key,
+                        ContentType='application/x-ndjson'
+                    )['UploadId']
+                parts.append(upload_part(bucket, key, upload_id, len(parts) + 1, buffer))
+                buffer = bytearray()
+
+        if upload_id is None:
+            # Small segment: a single put is enough.
+            s3.put_object(Bucket=bucket, Key=key, Body=bytes(buffer), ContentType='application/x-ndjson')
+        else:
+            if buffer:
+                parts.append(upload_part(bucket, key, upload_id, len(parts) + 1, buffer))
+            s3.complete_multipart_upload(
+                Bucket=bucket,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={'Parts': parts}
+            )
+    except Exception:
+        if upload_id is not None:
+            s3.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+        raise
+
+    return {'segment': segment, 'key': key, 'count': count}
+
+def upload_part(bucket, key, upload_id, part_number, data):
+    result = s3.upload_part(
+        Bucket=bucket,
+        Key=key,
+        UploadId=upload_id,
+        PartNumber=part_number,
+        Body=bytes(data)
+    )
+    return {'ETag': result['ETag'], 'PartNumber': part_number}
 
 def find_by_email(event):
     """Find user by email using GSI."""
     email = event.get('email')
+    fields, error = requested_fields(event)
+    if error:
+        return error
 
-    response = table.query(
-        IndexName='EmailIndex',
-        KeyConditionExpression='email = :email',
-        ExpressionAttributeValues={':email': email}
-    )
+    item = cached_user_by_email(email)
+    if item is not None:
+        cache_stats['email_hits'] += 1
+    else:
+        cache_stats['email_misses'] += 1
+        result = table.query(
+            IndexName='EmailIndex',
+            KeyConditionExpression='email = :email',
+            ExpressionAttributeValues={':email': email},
+            **projection_params(fields)
+        )
 
-    if response['Count'] == 0:
-        return {
-            'statusCode': 404,
-            'body': json.dumps({'error': 'User not found'})
-        }
+        if result['Count'] == 0:
+            return response(404, {'error': 'User not found'})
+        item = result['Items'][0]
+        if not fields:
+            cache_user(item)
 
-    return {
-        'statusCode': 200,
-        'body': json.dumps(response['Items'][0], default=str)
-    }
+    print(f"User cache: {cache_metrics()}")
+    return response(200, project(item, fields))
+
+def cached_user(user_id):
+    """Return the cached item for user_id, or None if absent or expired."""
+    entry = user_cache.get(user_id)
+    if not entry:
+        return None
+    if time.monotonic() - entry['cached_at'] >= CACHE_TTL_SECONDS:
+        evict_user(user_id)
+        return None
+    user_cache.move_to_end(user_id)
+    return entry['item']
+
+def cached_user_by_email(email):
+    entry = email_cache.get(email)
+    if not entry:
+        return None
+    item = None
+    if time.monotonic() - entry['cached_at'] < CACHE_TTL_SECONDS:
+        item = cached_user(entry['userId'])
+    # The mapping is only good while the cached user still has this email.
+    if item is None or item.get('email') != email:
+        email_cache.pop(email, None)
+        return None
+    email_cache.move_to_end(email)
+    return item
+
+def cache_user(item):
+    user_id = item['userId']
+    previous = user_cache.get(user_id)
+    if previous and previous['item'].get('email') != item.get('email'):
+        drop_email(previous['item'].get('email'), user_id)
+
+    now = time.monotonic()
+    user_cache[user_id] = {'item': item, 'cached_at': now}
+    user_cache.move_to_end(user_id)
+    if item.get('email'):
+        email_cache[item['email']] = {'userId': user_id, 'cached_at': now}
+        email_cache.move_to_end(item['email'])
+
+    while len(user_cache) > CACHE_MAX_USERS:
+        user_cache.popitem(last=False)
+    while len(email_cache) > CACHE_MAX_USERS:
+        email_cache.popitem(last=False)
+
+def evict_user(user_id):
+    entry = user_cache.pop(user_id, None)
+    if entry:
+        drop_email(entry['item'].get('email'), user_id)
+
+def drop_email(email, user_id):
+    entry = email_cache.get(email)
+    if entry and entry['userId'] == user_id:
+        del email_cache[email]
+
+def cache_metrics():
+    lookups = sum(cache_stats.values())
+    hits = cache_stats['hits'] + cache_stats['email_hits']
+    return dict(cache_stats, size=len(user_cache), hit_ratio=round(hits / lookups, 3) if lookups else None)
@@ -1,10 +1,9 @@
 import json
-import os
-import boto3
 from datetime import datetime
 
-endpoint_url = os.environ.get('AWS_ENDPOINT_URL', 'http://localhost:4566')
-s3 = boto3.client('s3', endpoint_url=endpoint_url)
+from aws_clients import client
+
+s3 = client('s3')
 
 def lambda_handler(event, context):
     order_id = event['orderId']
@@ -1,33 +1,24 @@
-import json
-import os
-import boto3
+from api_response import response
+from aws_clients import table
+from projection import parse_fields, project, projection_params
 
-endpoint_url = os.environ.get('AWS_ENDPOINT_URL', 'http://localhost:4566')
-dynamodb = boto3.resource('dynamodb', endpoint_url=endpoint_url)
-orders_table = dynamodb.Table('Orders')
+orders_table = table('Orders', json_numbers=True)
 
 def lambda_handler(event, context):
+    try:
+        # ?fields=status,totalPrice returns only those attributes.
+        fields = parse_fields((event.get('queryStringParameters') or {}).get('fields'))
+    except ValueError as e:
+        return response(400, {'error': str(e)})
+
     try:
         order_id = event['pathParameters']['orderId']
 
-        response = orders_table.get_item(Key={'orderId': order_id})
+        result = orders_table.get_item(Key={'orderId': order_id}, **projection_params(fields))
 
-        if 'Item' not in response:
-            return {
-                'statusCode': 404,
-                'body': json.dumps({'error': 'Order not found'})
-            }
+        if 'Item' not in result:
+            return response(404, {'error': 'Order not found'})
 
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps(response['Item'], default=str)
-        }
+        return response(200, project(result['Item'], fields))
     except Exception as e:
-        return {
-            'statusCode': 500,
-            'body': json.dumps({'error': str(e)})
-        }
+        return response(500, {'error': str(e)})
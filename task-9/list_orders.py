@@ -1,28 +1,22 @@
-import json
-import os
-import boto3
+from api_response import response
+from aws_clients import table
+from projection import parse_fields, project, projection_params
 
-endpoint_url = os.environ.get('AWS_ENDPOINT_URL', 'http://localhost:4566')
-dynamodb = boto3.resource('dynamodb', endpoint_url=endpoint_url)
-orders_table = dynamodb.Table('Orders')
+orders_table = table('Orders', json_numbers=True)
 
 def lambda_handler(event, context):
     try:
-        response = orders_table.scan()
+        # ?fields=orderId,status returns only those attributes.
+        fields = parse_fields((event.get('queryStringParameters') or {}).get('fields'))
+    except ValueError as e:
+        return response(400, {'error': str(e)})
 
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({
-                'count': response['Count'],
-                'orders': response['Items']
-            }, default=str)
-        }
+    try:
+        result = orders_table.scan(**projection_params(fields))
+
+        return response(200, {
+            'count': result['Count'],
+            'orders': [project(item, fields) for item in result['Items']]
+        })
     except Exception as e:
-        return {
-            'statusCode': 500,
-            'body': json.dumps({'error': str(e)})
-        }
+        return response(500, {'error': str(e)})
@@ -1,23 +1,37 @@
 import json
 import os
-import boto3
 
-endpoint_url = os.environ.get('AWS_ENDPOINT_URL', 'http://localhost:4566')
-stepfunctions = boto3.client('stepfunctions', endpoint_url=endpoint_url)
+from aws_clients import client
+from idempotency import IdempotencyGuard
+
+stepfunctions = client('stepfunctions')
 
 STATE_MACHINE_ARN = 'arn:aws:states:us-east-1:000000000000:stateMachine:order-processing-workflow'
 
+# Set IDEMPOTENCY_TABLE to skip orders whose execution was already started.
+idempotency = IdempotencyGuard(os.environ.get('IDEMPOTENCY_TABLE'))
+
 def lambda_handler(event, context):
     for record in event['Records']:
         order = json.loads(record['body'])
 
         execution_name = f"order-{order['orderId']}"
 
-        stepfunctions.start_execution(
-            stateMachineArn=STATE_MACHINE_ARN,
-            name=execution_name,
-            input=json.dumps(order)
-        )
+        def start():
+            try:
+                result = stepfunctions.start_execution(
+                    stateMachineArn=STATE_MACHINE_ARN,
+                    name=execution_name,
+                    input=json.dumps(order)
+                )
+                return {'executionArn': result['executionArn']}
+            except stepfunctions.exceptions.ExecutionAlreadyExists:
+                # Started by an earlier delivery that did not get to record it.
+                return {'executionName': execution_name}
+
+        _, duplicate = idempotency.run(f"process-order#{order['orderId']}", start)
+        if duplicate:
+            print(f"Skipped duplicate delivery of order {order['orderId']}")
 
     return {
         'statusCode': 200,
@@ -1,16 +1,21 @@
 import json
+import os
 import random
 
+# Simulated outcomes; set RANDOM_SEED for reproducible runs.
+rng = random.Random(os.environ.get('RANDOM_SEED'))
+PAYMENT_SUCCESS_RATE = float(os.environ.get('PAYMENT_SUCCESS_RATE', '0.95'))
+
 def lambda_handler(event, context):
     total_price = event['validation']['totalPrice']
 
-    success = random.random() < 0.95
+    success = rng.random() < PAYMENT_SUCCESS_RATE
 
     if not success:
         raise Exception('Payment gateway error')
 
     return {
         'paymentStatus': 'completed',
-        'transactionId': f'TXN-{random.randint(100000, 999999)}',
+        'transactionId': f'TXN-{rng.randint(100000, 999999)}',
         'amount': total_price
     }
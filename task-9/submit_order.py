@@ -1,14 +1,13 @@
 import json
 import os
 import uuid
-import boto3
 from datetime import datetime
 
-endpoint_url = os.environ.get('AWS_ENDPOINT_URL', 'http://localhost:4566')
-dynamodb = boto3.resource('dynamodb', endpoint_url=endpoint_url)
-sqs = boto3.client('sqs', endpoint_url=endpoint_url)
+from api_response import response
+from aws_clients import client, table
 
-orders_table = dynamodb.Table('Orders')
+sqs = client('sqs')
+orders_table = table('Orders')
 QUEUE_URL = os.environ.get('QUEUE_URL', 'http://localhost:4566/000000000000/order-processing-queue')
 
 def lambda_handler(event, context):
@@ -32,24 +31,11 @@ def lambda_handler(event, context):
             MessageBody=json.dumps(order)
         )
 
-        return {
-            'statusCode': 202,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({
-                'message': 'Order submitted for processing',
-                'orderId': order_id
-            })
-        }
+        return response(202, {
+            'message': 'Order submitted for processing',
+            'orderId': order_id
+        })
     except KeyError as e:
-        return {
-            'statusCode': 400,
-            'body': json.dumps({'error': f'Missing required field: {str(e)}'})
-        }
+        return response(400, {'error': f'Missing required field: {str(e)}'})
     except Exception as e:
-        return {
-            'statusCode': 500,
-            'body': json.dumps({'error': str(e)})
-        }
+        return response(500, {'error': str(e)})
@@ -1,11 +1,9 @@
 import json
-import os
-import boto3
 from decimal import Decimal
 
-endpoint_url = os.environ.get("AWS_ENDPOINT_URL", "http://localhost:4566")
-dynamodb = boto3.resource("dynamodb", endpoint_url=endpoint_url)
-orders_table = dynamodb.Table("Orders")
+from aws_clients import table
+
+orders_table = table("Orders")
 
 
 def lambda_handler(event, context):
@@ -1,10 +1,8 @@
 import json
-import os
-import boto3
 
-endpoint_url = os.environ.get('AWS_ENDPOINT_URL', 'http://localhost:4566')
-dynamodb = boto3.resource('dynamodb', endpoint_url=endpoint_url)
-inventory_table = dynamodb.Table('Inventory')
+from aws_clients import table
+
+inventory_table = table('Inventory')
 
 def lambda_handler(event, context):
     product_id = event['productId']
@@ -0,0 +1,430 @@
+"""Run Step Functions workflows in-process, without LocalStack.
+
+Covers the Amazon States Language subset used by the task-7 and task-9
+workflows: Task, Parallel, Choice, Pass, Succeed, Fail, InputPath/OutputPath,
+Parameters, ResultSelector, ResultPath, Retry and Catch. Task states call
+Python lambda_handler functions directly, and Retry intervals advance a
+virtual clock instead of sleeping, so one process can run thousands of
+executions per second. Parallel branches run one after another, but the
+state is charged the virtual time of its slowest branch, as if they had run
+concurrently; for the same reason a failing branch does not stop the others.
+
+    python tools/asl_interpreter.py task-7/order-workflow.json \\
+        '{"orderId": "ORD-1", "amount": 50, "customerId": "C-1"}'
+
+Task resources resolve to `<function_name with - as _>.py` next to the
+workflow file unless a `resources` mapping of function name -> callable is
+passed. The task-9 handlers talk to DynamoDB/S3 at call time, so running
+that workflow usually means passing in-memory stand-ins for them.
+"""
+import argparse
+import copy
+import importlib.util
+import json
+import os
+import re
+import sys
+import time
+
+# In Lambda the shared/ modules are zipped next to the handlers.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'shared'))
+
+MAX_TRANSITIONS = 25000
+
+class States:
+    """Error names defined by the States Language."""
+    ALL = 'States.ALL'
+    TASK_FAILED = 'States.TaskFailed'
+    RUNTIME = 'States.Runtime'
+    NO_CHOICE = 'States.NoChoiceMatched'
+
+class TaskError(Exception):
+    def __init__(self, error, cause, attempts):
+        super().__init__(f"{error}: {cause}")
+        self.error = error
+        self.cause = cause
+        self.attempts = attempts
+
+class ExecutionFailed(Exception):
+    def __init__(self, error, cause):
+        super().__init__(f"{error}: {cause}")
+        self.error = error
+        self.cause = cause
+
+class VirtualClock:
+    """Seconds of simulated time; Retry waits advance it instead of sleeping."""
+    def __init__(self):
+        self.now = 0.0
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+class LambdaContext:
+    function_name = 'local'
+
+    def get_remaining_time_in_millis(self):
+        return 300000
+
+class Execution:
+    def __init__(self, status, output=None, error=None, cause=None, history=None, elapsed=0.0):
+        self.status = status
+        self.output = output
+        self.error = error
+        self.cause = cause
+        self.history = history or []
+        self.elapsed = elapsed
+
+    def to_dict(self):
+        return {
+            'status': self.status,
+            'output': self.output,
+            'error': self.error,
+            'cause': self.cause,
+            'virtualSeconds': self.elapsed,
+            'history': self.history
+        }
+
+class StateMachine:
+    def __init__(self, definition, resources=None, base_dir=None, clock=None, observer=None,
+                 latency=None):
+        """definition: parsed ASL dict. resources: function name -> callable(event, context).
+
+        observer(state_name, state_type, attempts, virtual_seconds, wall_seconds,
+        error) is called after every state, for instrumentation. virtual_seconds
+        includes Retry waits; wall_seconds is the time spent in-process.
+
+        latency(function_name, task_input) returns the virtual seconds charged
+        for each Lambda invocation, to model how long the real function takes.
+        """
+        self.definition = definition
+        self.resources = dict(resources or {})
+        self.base_dir = base_dir
+        self.clock = clock or VirtualClock()
+        self.observer = observer
+        self.latency = latency
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        with open(path) as f:
+            definition = json.load(f)
+        kwargs.setdefault('base_dir', os.path.dirname(os.path.abspath(path)))
+        return cls(definition, **kwargs)
+
+    def execute(self, execution_input):
+        history = []
+        started = self.clock.now
+        try:
+            output = self.run_states(self.definition, copy.deepcopy(execution_input), history)
+            return Execution('SUCCEEDED', output=output, history=history, elapsed=self.clock.now - started)
+        except ExecutionFailed as e:
+            return Execution('FAILED', error=e.error, cause=e.cause, history=history,
+                             elapsed=self.clock.now - started)
+
+    def run_states(self, machine, data, history):
+        states = machine['States']
+        name = machine['StartAt']
+        for _ in range(MAX_TRANSITIONS):
+            state = states[name]
+            state_type = state['Type']
+            state_started = (self.clock.now, time.perf_counter())
+            attempts = 1
+            error = None
+            next_name = None
+
+            if state_type == 'Fail':
+                error = state.get('Error', 'States.Fail')
+                self.observe(name, state_type, attempts, state_started, error, history)
+                raise ExecutionFailed(error, state.get('Cause'))
+
+            if state_type == 'Succeed':
+                self.observe(name, state_type, attempts, state_started, None, history)
+                return apply_path(data, state.get('OutputPath', '$'))
+
+            if state_type == 'Choice':
+                next_name = self.choose(state, apply_path(data, state.get('InputPath', '$')))
+                if next_name is None:
+                    self.observe(name, state_type, attempts, state_started, States.NO_CHOICE, history)
+                    raise ExecutionFailed(States.NO_CHOICE, f"No choice rule matched in {name}")
+                self.observe(name, state_type, attempts, state_started, None, history)
+                name = next_name
+                continue
+
+            if state_type == 'Pass':
+                result = state['Result'] if 'Result' in state else state_input(data, state)
+                data = apply_output(data, copy.deepcopy(result), state)
+            elif state_type in ('Task', 'Parallel'):
+                try:
+                    if state_type == 'Task':
+                        result, attempts = self.run_task(state, state_input(data, state))
+                    else:
+                        result, attempts = self.run_parallel(state, state_input(data, state), history)
+                    data = apply_output(data, result, state)
+                except TaskError as e:
+                    error = e.error
+                    catcher = find_rule(state.get('Catch', []), e.error)
+                    if catcher is None:
+                        self.observe(name, state_type, e.attempts, state_started, error, history)
+                        raise ExecutionFailed(e.error, e.cause)
+                    attempts = e.attempts
+                    error_output = {'Error': e.error, 'Cause': e.cause}
+                    data = set_path(data, catcher.get('ResultPath', '$'), error_output)
+                    next_name = catcher['Next']
+            else:
+                raise ExecutionFailed(States.RUNTIME, f"Unsupported state type {state_type} in {name}")
+
+            self.observe(name, state_type, attempts, state_started, error, history)
+
+            if next_name is None:
+                if state.get('End'):
+                    return data
+                next_name = state['Next']
+            name = next_name
+
+        raise ExecutionFailed(States.RUNTIME, f"Exceeded {MAX_TRANSITIONS} state transitions")
+
+    def run_task(self, state, task_input):
+        handler = self.resolve(state['Resource'])
+        function_name = resource_function_name(state['Resource'])
+
+        def invoke():
+            if self.latency:
+                self.clock.sleep(self.latency(function_name, task_input))
+            # Round-trip through JSON like the real Lambda invoke does.
+            result = handler(json.loads(json.dumps(task_input)), LambdaContext())
+            return json.loads(json.dumps(result))
+
+        return self.with_retry(state, invoke)
+
+    def run_parallel(self, state, state_input, history):
+        def run_branches():
+            started = self.clock.now
+            outputs = []
+            finished = []
+            failure = None
+            for branch in state['Branches']:
+                # Every branch starts at the same virtual time. The branches
+                # would be running concurrently, so the others still run to
+                # completion (and keep their side effects) when one fails;
+                # the first failure then fails the state.
+                self.clock.now = started
+                try:
+                    outputs.append(self.run_states(branch, copy.deepcopy(state_input), history))
+                except ExecutionFailed as e:
+                    failure = failure or e
+                finished.append(self.clock.now)
+            self.clock.now = max(finished, default=started)
+            if failure:
+                raise failure
+            return outputs
+
+        return self.with_retry(state, run_branches)
+
+    def with_retry(self, state, attempt):
+        """Run attempt() under the state's Retry rules; returns (result, attempts)."""
+        retriers = state.get('Retry', [])
+        retry_counts = [0] * len(retriers)
+        attempts = 0
+        while True:
+            attempts += 1
+            try:
+                return attempt(), attempts
+            except ExecutionFailed as e:
+                # A failed Parallel branch: its error becomes the state's error.
+                error = e.error
+                cause = e.cause
+            except Exception as e:
+                error = type(e).__name__
+                cause = json.dumps({'errorMessage': str(e), 'errorType': error})
+
+            index = find_rule_index(retriers, error)
+            if index is None or retry_counts[index] >= retriers[index].get('MaxAttempts', 3):
+                raise TaskError(error, cause, attempts)
+            retrier = retriers[index]
+            delay = retrier.get('IntervalSeconds', 1) * retrier.get('BackoffRate', 2.0) ** retry_counts[index]
+            if 'MaxDelaySeconds' in retrier:
+                delay = min(delay, retrier['MaxDelaySeconds'])
+            retry_counts[index] += 1
+            self.clock.sleep(delay)
+
+    def resolve(self, resource):
+        function_name = resource_function_name(resource)
+        if function_name not in self.resources:
+            if not self.base_dir:
+                raise ExecutionFailed(States.RUNTIME, f"No local handler for {resource}")
+            path = os.path.join(self.base_dir, function_name.replace('-', '_') + '.py')
+            self.resources[function_name] = load_handler(path)
+        return self.resources[function_name]
+
+    def choose(self, state, data):
+        for rule in state['Choices']:
+            if evaluate_choice(rule, data):
+                return rule['Next']
+        return state.get('Default')
+
+    def observe(self, name, state_type, attempts, started, error, history):
+        history.append({'state': name, 'type': state_type, 'attempts': attempts, 'error': error})
+        if self.observer:
+            virtual_started, wall_started = started
+            self.observer(name, state_type, attempts, self.clock.now - virtual_started,
+                          time.perf_counter() - wall_started, error)
+
+def load_handler(path, handler_name='lambda_handler'):
+    # Unique module names: task-7 and task-9 both have e.g. process_payment*.py.
+    module_name = 'asl_local_' + os.path.splitext(os.path.abspath(path))[0].replace(os.sep, '_').replace('-', '_')
+    module = sys.modules.get(module_name)
+    if module is None:
+        spec = importlib.util.spec_from_file_location(module_name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        sys.modules[module_name] = module
+    return getattr(module, handler_name)
+
+def resource_function_name(resource):
+    return resource.split(':function:')[-1].split(':')[0]
+
+def error_matches(error_equals, error):
+    if States.ALL in error_equals or error in error_equals:
+        return True
+    # Any Lambda failure other than a timeout counts as States.TaskFailed.
+    return States.TASK_FAILED in error_equals and error != 'States.Timeout'
+
+def find_rule_index(rules, error):
+    for index, rule in enumerate(rules):
+        if error_matches(rule['ErrorEquals'], error):
+            return index
+    return None
+
+def find_rule(rules, error):
+    index = find_rule_index(rules, error)
+    return None if index is None else rules[index]
+
+MISSING = object()
+
+PATH_PART = re.compile(r'\.([^.\[\]]+)|\[(\d+)\]')
+
+def parse_path(path):
+    """'$.a.b[0]' -> ['a', 'b', 0]; only field names and array indexes."""
+    if not path.startswith('$'):
+        raise ExecutionFailed(States.RUNTIME, f"Unsupported path: {path}")
+    parts = []
+    position = 1
+    while position < len(path):
+        match = PATH_PART.match(path, position)
+        if not match:
+            raise ExecutionFailed(States.RUNTIME, f"Unsupported path: {path}")
+        parts.append(match.group(1) if match.group(1) is not None else int(match.group(2)))
+        position = match.end()
+    return parts
+
+def get_path(data, path):
+    for part in parse_path(path):
+        if isinstance(part, int):
+            if not isinstance(data, list) or part >= len(data):
+                return MISSING
+        elif not isinstance(data, dict) or part not in data:
+            return MISSING
+        data = data[part]
+    return data
+
+def apply_path(data, path):
+    if path is None:
+        return {}
+    value = get_path(data, path)
+    if value is MISSING:
+        raise ExecutionFailed(States.RUNTIME, f"Path {path} not found in input")
+    return value
+
+def set_path(data, path, value):
+    if path is None:
+        return data
+    parts = parse_path(path)
+    if not parts:
+        return value
+    if any(isinstance(part, int) for part in parts):
+        raise ExecutionFailed(States.RUNTIME, f"ResultPath cannot index arrays: {path}")
+    data = copy.copy(data) if isinstance(data, dict) else {}
+    target = data
+    for part in parts[:-1]:
+        child = target.get(part)
+        child = copy.copy(child) if isinstance(child, dict) else {}
+        target[part] = child
+        target = child
+    target[parts[-1]] = value
+    return data
+
+def apply_template(template, data):
+    """Build a Parameters/ResultSelector payload; keys ending in .$ are paths into data."""
+    if isinstance(template, dict):
+        return {key[:-2] if key.endswith('.$') else key:
+                apply_path(data, value) if key.endswith('.$') else apply_template(value, data)
+                for key, value in template.items()}
+    if isinstance(template, list):
+        return [apply_template(value, data) for value in template]
+    return copy.deepcopy(template)
+
+def state_input(data, state):
+    value = apply_path(data, state.get('InputPath', '$'))
+    if 'Parameters' in state:
+        value = apply_template(state['Parameters'], value)
+    return value
+
+def apply_output(data, result, state):
+    if 'ResultSelector' in state:
+        result = apply_template(state['ResultSelector'], result)
+    data = set_path(data, state.get('ResultPath', '$'), result)
+    return apply_path(data, state.get('OutputPath', '$'))
+
+COMPARATORS = {
+    'StringEquals': lambda a, b: isinstance(a, str) and a == b,
+    'StringLessThan': lambda a, b: isinstance(a, str) and a < b,
+    'StringGreaterThan': lambda a, b: isinstance(a, str) and a > b,
+    'NumericEquals': lambda a, b: is_number(a) and a == b,
+    'NumericLessThan': lambda a, b: is_number(a) and a < b,
+    'NumericLessThanEquals': lambda a, b: is_number(a) and a <= b,
+    'NumericGreaterThan': lambda a, b: is_number(a) and a > b,
+    'NumericGreaterThanEquals': lambda a, b: is_number(a) and a >= b,
+    'BooleanEquals': lambda a, b: isinstance(a, bool) and a == b,
+}
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def evaluate_choice(rule, data):
+    if 'And' in rule:
+        return all(evaluate_choice(r, data) for r in rule['And'])
+    if 'Or' in rule:
+        return any(evaluate_choice(r, data) for r in rule['Or'])
+    if 'Not' in rule:
+        return not evaluate_choice(rule['Not'], data)
+
+    value = get_path(data, rule['Variable'])
+    if 'IsPresent' in rule:
+        return (value is not MISSING) == rule['IsPresent']
+    if value is MISSING:
+        return False
+    if 'IsNull' in rule:
+        return (value is None) == rule['IsNull']
+    for name, compare in COMPARATORS.items():
+        if name in rule:
+            return compare(value, rule[name])
+        if name + 'Path' in rule:
+            return compare(value, get_path(data, rule[name + 'Path']))
+    raise ExecutionFailed(States.RUNTIME, f"Unsupported choice rule: {rule}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('workflow', help='Path to the ASL JSON definition')
+    parser.add_argument('input', nargs='?', default='{}', help='Execution input as JSON')
+    parser.add_argument('--seed', type=int, help='Seed the simulated handlers (sets RANDOM_SEED)')
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        # Read by the handlers' RNGs when they are imported.
+        os.environ['RANDOM_SEED'] = str(args.seed)
+    machine = StateMachine.from_file(args.workflow)
+    execution = machine.execute(json.loads(args.input))
+    print(json.dumps(execution.to_dict(), indent=2))
+    return 0 if execution.status == 'SUCCEEDED' else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
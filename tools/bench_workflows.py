@@ -0,0 +1,398 @@
+"""Benchmark the order workflows in-process with synthetic orders.
+
+Drives the task-7 (sequential and parallel variants) and task-9 state
+machines through tools/asl_interpreter.py,
+with in-memory stand-ins for the DynamoDB tables and S3 bucket the task-9
+steps use, and reports:
+
+- orders/sec (wall clock, in-process)
+- p50/p95/p99 latency per state, both wall clock and virtual (the virtual
+  figure includes Retry backoff, which the interpreter does not sleep for)
+- retry amplification: Lambda invocations per Task state execution
+- how executions ended: outcome counts and the distribution of state paths
+- payment holds leaked: task-7 authorizations never captured or voided
+
+    python tools/bench_workflows.py --orders 20000 --seed 42 --output bench.json
+
+Lambda invocations take no virtual time unless --latency-ms assigns them
+some, per function or per function:action (the task-7 payment actions):
+
+    python tools/bench_workflows.py --workflow task-7 --workflow task-7-parallel \
+        --latency-ms check-inventory=200 --latency-ms process-payment=250 \
+        --latency-ms process-payment:capture=50 --latency-ms process-payment:void=50
+
+--fail-rate makes a function (or function:action) raise at the given rate,
+and --cases runs fixed failure scenarios that must not leak a payment hold:
+
+    python tools/bench_workflows.py --fail-rate check-inventory=0.05
+    python tools/bench_workflows.py --cases
+
+Handler randomness is seeded per workflow, so runs with the same --seed take
+the same paths and results can be compared across commits. The simulated
+failure rates come from the handlers' environment variables
+(AVAILABILITY_RATE, PAYMENT_SUCCESS_RATE).
+"""
+import argparse
+import copy
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from asl_interpreter import StateMachine, load_handler
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Only needed if a handler creates a real boto3 client; the stand-ins below replace them.
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+PERCENTILES = (50, 95, 99)
+
+class MemoryTable:
+    """The subset of a boto3 DynamoDB Table the workflow steps call."""
+    def __init__(self, key_name, items=None):
+        self.key_name = key_name
+        self.items = {item[key_name]: item for item in items or []}
+
+    def get_item(self, Key):
+        item = self.items.get(Key[self.key_name])
+        return {'Item': copy.deepcopy(item)} if item is not None else {}
+
+    def put_item(self, Item):
+        self.items[Item[self.key_name]] = copy.deepcopy(Item)
+        return {}
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeValues,
+                    ExpressionAttributeNames=None, **kwargs):
+        # Only plain `SET a = :a, #b = :b` expressions, as used by the steps.
+        names = ExpressionAttributeNames or {}
+        item = self.items.setdefault(Key[self.key_name], dict(Key))
+        assignments = UpdateExpression.strip()[len('SET '):].split(',')
+        for assignment in assignments:
+            name, value = (part.strip() for part in assignment.split('='))
+            item[names.get(name, name)] = ExpressionAttributeValues[value]
+        return {}
+
+class MemoryS3:
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[(Bucket, Key)] = Body
+        return {'ETag': '"local"'}
+
+class Instrumented:
+    """A Lambda handler that fails at the --fail-rate rates and tracks payment holds.
+
+    `holds` is the set of authorization IDs that were authorized but not yet
+    captured or voided.
+    """
+    def __init__(self, function_name, handler, fail_rates, rng, holds):
+        self.function_name = function_name
+        self.handler = handler
+        # seed_handlers() reseeds the wrapped handler's module.
+        self.__globals__ = handler.__globals__
+        self.fail_rates = fail_rates
+        self.rng = rng
+        self.holds = holds
+
+    def __call__(self, event, context):
+        action = event.get('action') if isinstance(event, dict) else None
+        rate = self.fail_rates.get(f'{self.function_name}:{action}', self.fail_rates.get(self.function_name, 0))
+        if rate and self.rng.random() < rate:
+            raise Exception(f'Injected failure in {self.function_name}')
+        result = self.handler(event, context)
+        if action == 'authorize':
+            self.holds.add(result['authorizationId'])
+        elif action in ('capture', 'void'):
+            self.holds.discard(event['authorizationId'])
+        return result
+
+class Recorder:
+    """Observer for StateMachine: collects per-state samples."""
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.wall = defaultdict(list)
+        self.virtual = defaultdict(list)
+        self.attempts = defaultdict(int)
+        self.executions = defaultdict(int)
+        self.errors = defaultdict(Counter)
+
+    def __call__(self, state_name, state_type, attempts, virtual_seconds, wall_seconds, error):
+        self.wall[state_name].append(wall_seconds)
+        self.virtual[state_name].append(virtual_seconds)
+        self.executions[state_name] += 1
+        if state_type == 'Task':
+            self.attempts[state_name] += attempts
+        if error:
+            self.errors[state_name][error] += 1
+
+def task7_orders(rng, count, invalid_rate):
+    for i in range(count):
+        order = {'orderId': f'ORD-{i:06d}', 'amount': round(rng.uniform(1, 500), 2),
+                 'customerId': f'CUST-{rng.randint(1, 1000):04d}'}
+        if rng.random() < invalid_rate:
+            if rng.random() < 0.5:
+                order['amount'] = 0
+            else:
+                del order['customerId']
+        yield order
+
+def task9_orders(rng, count, invalid_rate, products):
+    for i in range(count):
+        product_id = rng.choice(products)
+        if rng.random() < invalid_rate:
+            product_id = 'PROD-UNKNOWN'
+        yield {'orderId': f'ORD-{i:06d}', 'customerId': f'CUST-{rng.randint(1, 1000):04d}',
+               'productId': product_id, 'quantity': rng.randint(1, 5)}
+
+WORKFLOWS = {
+    'task-7': os.path.join('task-7', 'order-workflow.json'),
+    'task-7-parallel': os.path.join('task-7', 'order-workflow-parallel.json'),
+    'task-9': os.path.join('task-9', 'order-processing-workflow.json'),
+}
+
+# Failure scenarios for --cases: (workflow, --fail-rate values, description).
+# Each must end every execution without an open payment hold.
+CASES = [
+    ('task-7-parallel', ['check-inventory=1'], 'inventory check fails while the payment is authorized'),
+    ('task-7-parallel', ['check-inventory=0.3'], 'inventory check fails now and then'),
+    ('task-7-parallel', ['process-payment:capture=1'], 'capture fails after authorization'),
+    ('task-7', ['check-inventory=1'], 'inventory check fails in the sequential workflow'),
+]
+
+def parse_rates(values):
+    """['check-inventory=0.05', 'process-payment:capture=1'] -> {name: rate}."""
+    rates = {}
+    for value in values:
+        name, _, rate = value.partition('=')
+        rates[name] = float(rate)
+    return rates
+
+def parse_latencies(values):
+    """['check-inventory=200', 'process-payment:void=50'] -> StateMachine latency callable."""
+    latencies_ms = {}
+    for value in values:
+        name, _, ms = value.partition('=')
+        latencies_ms[name] = float(ms)
+
+    def latency(function_name, task_input):
+        action = task_input.get('action') if isinstance(task_input, dict) else None
+        ms = latencies_ms.get(f'{function_name}:{action}', latencies_ms.get(function_name, 0))
+        return ms / 1000
+    return latency
+
+def task7_machine(observer, name, latency):
+    return StateMachine.from_file(os.path.join(ROOT, WORKFLOWS[name]), observer=observer,
+                                  latency=latency)
+
+def task9_machine(observer, rng, product_count, latency):
+    base_dir = os.path.join(ROOT, 'task-9')
+    inventory = MemoryTable('productId', [
+        {'productId': f'PROD-{i:03d}', 'name': f'Product {i}',
+         'price': Decimal(str(round(rng.uniform(1, 200), 2))), 'stock': Decimal(rng.randint(0, 100))}
+        for i in range(product_count)
+    ])
+    backends = {
+        'validate-order-step': {'inventory_table': inventory},
+        'generate-receipt-step': {'s3': MemoryS3()},
+        'update-order-status-step': {'orders_table': MemoryTable('orderId')},
+    }
+    resources = {}
+    for function_name in ('validate-order-step', 'process-payment-step',
+                          'generate-receipt-step', 'update-order-status-step'):
+        handler = load_handler(os.path.join(base_dir, function_name.replace('-', '_') + '.py'))
+        handler.__globals__.update(backends.get(function_name, {}))
+        resources[function_name] = handler
+    machine = StateMachine.from_file(os.path.join(ROOT, WORKFLOWS['task-9']), resources=resources,
+                                     observer=observer, latency=latency)
+    return machine, sorted(inventory.items)
+
+def seed_handlers(machine, seed, workflow):
+    """Reseed the handlers' module-level RNGs so each workflow is reproducible."""
+    for function_name in sorted(machine.resources):
+        handler_globals = machine.resources[function_name].__globals__
+        if isinstance(handler_globals.get('rng'), random.Random):
+            handler_globals['rng'].seed(f'{seed}:{workflow}:{function_name}')
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    # Nearest-rank percentile.
+    index = max(0, math.ceil(p / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+def latency_summary(samples, scale):
+    samples = sorted(samples)
+    summary = {f'p{p}': round(percentile(samples, p) * scale, 3) for p in PERCENTILES}
+    summary['max'] = round(samples[-1] * scale, 3)
+    return summary
+
+def run_workflow(name, args):
+    # Variants of a workflow share orders and handler seeds, so their results line up.
+    family = name.replace('-parallel', '')
+    rng = random.Random(f'{args.seed}:{family}:orders')
+    recorder = Recorder()
+    latency = parse_latencies(args.latency_ms)
+    if family == 'task-7':
+        machine = task7_machine(recorder, name, latency)
+        orders = list(task7_orders(rng, args.orders + args.warmup, args.invalid_rate))
+    else:
+        machine, products = task9_machine(recorder, rng, args.products, latency)
+        orders = list(task9_orders(rng, args.orders + args.warmup, args.invalid_rate, products))
+    # Load every Task resource before seeding and timing.
+    for state in all_states(machine.definition).values():
+        if state['Type'] == 'Task':
+            machine.resolve(state['Resource'])
+    holds = set()
+    fail_rates = parse_rates(args.fail_rate)
+    failure_rng = random.Random(f'{args.seed}:{family}:failures')
+    for function_name, handler in list(machine.resources.items()):
+        machine.resources[function_name] = Instrumented(function_name, handler, fail_rates, failure_rng, holds)
+    seed_handlers(machine, args.seed, family)
+
+    for order in orders[:args.warmup]:
+        machine.execute(order)
+    recorder.reset()
+    holds.clear()
+
+    outcomes = Counter()
+    paths = Counter()
+    virtual_total = 0.0
+    holds_leaked = 0
+    started = time.perf_counter()
+    for order in orders[args.warmup:]:
+        execution = machine.execute(order)
+        holds_leaked += len(holds)
+        holds.clear()
+        outcomes[execution.status if execution.status == 'SUCCEEDED' else f'FAILED:{execution.error}'] += 1
+        paths[' > '.join(step['state'] for step in execution.history)] += 1
+        virtual_total += execution.elapsed
+    wall = time.perf_counter() - started
+
+    states = {}
+    task_executions = 0
+    task_attempts = 0
+    for state_name, state in all_states(machine.definition).items():
+        if state_name not in recorder.executions:
+            continue
+        entry = {
+            'type': state['Type'],
+            'executions': recorder.executions[state_name],
+            'wallMs': latency_summary(recorder.wall[state_name], 1000),
+            'virtualSeconds': latency_summary(recorder.virtual[state_name], 1),
+        }
+        if state['Type'] == 'Task':
+            entry['invocations'] = recorder.attempts[state_name]
+            entry['retryAmplification'] = round(recorder.attempts[state_name] / recorder.executions[state_name], 4)
+            task_executions += recorder.executions[state_name]
+            task_attempts += recorder.attempts[state_name]
+        if recorder.errors[state_name]:
+            entry['errors'] = dict(recorder.errors[state_name])
+        states[state_name] = entry
+
+    return {
+        'orders': args.orders,
+        'wallSeconds': round(wall, 4),
+        'ordersPerSecond': round(args.orders / wall, 1) if wall else None,
+        'meanVirtualSeconds': round(virtual_total / args.orders, 4) if args.orders else None,
+        'retryAmplification': round(task_attempts / task_executions, 4) if task_executions else None,
+        'holdsLeaked': holds_leaked,
+        'outcomes': dict(outcomes.most_common()),
+        'paths': dict(paths.most_common()),
+        'states': states
+    }
+
+def all_states(machine):
+    """Every state by name, including those inside Parallel branches."""
+    states = {}
+    for state_name, state in machine['States'].items():
+        states[state_name] = state
+        for branch in state.get('Branches', []):
+            states.update(all_states(branch))
+    return states
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_report(name, result):
+    print(f"{name}: {result['orders']} orders in {result['wallSeconds']}s "
+          f"({result['ordersPerSecond']} orders/s), retry amplification {result['retryAmplification']}, "
+          f"{result['holdsLeaked']} payment holds leaked")
+    for outcome, count in result['outcomes'].items():
+        print(f"  {outcome:<40} {count:>8} ({count / result['orders']:.1%})")
+    print(f"  {'state':<26} {'runs':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'p99 virt s':>10}")
+    for state_name, state in result['states'].items():
+        wall = state['wallMs']
+        print(f"  {state_name:<26} {state['executions']:>8} {wall['p50']:>8} {wall['p95']:>8} "
+              f"{wall['p99']:>8} {state['virtualSeconds']['p99']:>10}")
+
+def run_cases(args):
+    """Run CASES; returns the number that leaked a payment hold."""
+    failed = 0
+    for workflow, fail_rates, description in CASES:
+        case_args = argparse.Namespace(**dict(vars(args), warmup=0, fail_rate=fail_rates))
+        result = run_workflow(workflow, case_args)
+        ok = result['holdsLeaked'] == 0
+        failed += not ok
+        print(f"{'PASS' if ok else 'FAIL'} {workflow} ({', '.join(fail_rates)}): {description}: "
+              f"{result['holdsLeaked']} holds leaked, outcomes {result['outcomes']}")
+    return failed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--workflow', action='append', choices=sorted(WORKFLOWS) + ['all'],
+                        help='Workflow to run; repeatable (default: all)')
+    parser.add_argument('--orders', type=int, default=10000, help='Orders per workflow')
+    parser.add_argument('--warmup', type=int, default=200, help='Untimed orders run first')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--invalid-rate', type=float, default=0.05,
+                        help='Share of orders that fail validation')
+    parser.add_argument('--products', type=int, default=50, help='Inventory size for task-9')
+    parser.add_argument('--latency-ms', action='append', default=[], metavar='FUNCTION[:ACTION]=MS',
+                        help='Virtual duration of each Lambda invocation; repeatable')
+    parser.add_argument('--fail-rate', action='append', default=[], metavar='FUNCTION[:ACTION]=RATE',
+                        help='Make a Lambda invocation raise at this rate (0-1); repeatable')
+    parser.add_argument('--cases', action='store_true',
+                        help='Run the failure scenarios in CASES instead of the benchmark')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    args = parser.parse_args()
+    if args.orders <= 0:
+        parser.error('--orders must be positive')
+    if args.cases:
+        return 1 if run_cases(args) else 0
+
+    workflows = args.workflow or ['all']
+    workflows = list(WORKFLOWS) if 'all' in workflows else list(dict.fromkeys(workflows))
+    results = {
+        'commit': git_commit(),
+        'timestamp': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'parameters': vars(args),
+        'workflows': {}
+    }
+    for name in workflows:
+        results['workflows'][name] = run_workflow(name, args)
+        print_report(name, results['workflows'][name])
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,164 @@
+"""Profile a Lambda handler's cold start: import time per module and init time per client.
+
+Each run starts a fresh interpreter with `-X importtime`, imports the handler
+the way Lambda does and optionally invokes it once with --event. It then
+reports:
+
+- the handler's import time, and the modules it pulled in, by cumulative
+  import time (top-level imports only, so the figures don't double count)
+- the boto3 import, the session and each client, resource and table created
+  through shared/aws_clients.py (STARTUP_PROFILE=1)
+- the first invocation's duration, which now includes any lazy client creation
+
+    python tools/profile_cold_start.py task-9/submit_order.py --runs 5 \
+        --event '{"body": "{\\"customerId\\": \\"C-1\\", \\"productId\\": \\"PROD-001\\", \\"quantity\\": 1}"}'
+
+Figures are medians over --runs. Without LocalStack the invocation fails on
+its first AWS call, which is reported as `error`; the clients are created
+before that, so their times still count. For a real function, set
+PYTHONPROFILEIMPORTTIME=1 and STARTUP_PROFILE=1 in its environment; the same
+raw data then shows up in CloudWatch Logs.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MARKER = '@@profile '
+
+# Runs in the child interpreter. Only importlib is loaded before the handler,
+# so the handler's own imports (json, os, ...) are charged to it.
+CHILD = '''
+import importlib.util, sys, time
+path, handler_name, event = sys.argv[1], sys.argv[2], sys.argv[3]
+sys.stderr.write(%(marker)r + 'import\\n')
+sys.stderr.flush()
+start = time.perf_counter()
+spec = importlib.util.spec_from_file_location(handler_name.rpartition('.')[0], path)
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+import_ms = (time.perf_counter() - start) * 1000
+sys.stderr.write(%(marker)r + 'invoke\\n')
+sys.stderr.flush()
+import json
+invoke_ms = error = None
+if event:
+    start = time.perf_counter()
+    try:
+        getattr(module, handler_name.rpartition('.')[2])(json.loads(event), None)
+    except Exception as e:
+        error = f'{type(e).__name__}: {e}'
+    invoke_ms = (time.perf_counter() - start) * 1000
+clients = sys.modules['aws_clients'].startup_profile() if 'aws_clients' in sys.modules else {}
+print(%(marker)r + json.dumps({'importMs': import_ms, 'invokeMs': invoke_ms, 'error': error,
+                               'clients': clients}))
+''' % {'marker': MARKER}
+
+def parse_importtime(stderr):
+    """Top-level `-X importtime` entries by phase: {(phase, module): cumulative ms}."""
+    imports = {}
+    phase = None
+    for line in stderr.splitlines():
+        if line.startswith(MARKER):
+            phase = line[len(MARKER):]
+            continue
+        if phase is None or not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # the header line
+        name = fields[2][1:].rstrip()  # drop the space after '|'
+        if name.startswith(' '):
+            continue  # nested: already counted in its parent's cumulative time
+        imports[(phase, name.strip())] = int(fields[1]) / 1000
+    return imports
+
+def run_once(path, handler, event):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [
+        os.path.join(ROOT, 'shared'), os.path.dirname(os.path.abspath(path)), env.get('PYTHONPATH')]))
+    env['STARTUP_PROFILE'] = '1'
+    env.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', CHILD, path, handler, event or ''],
+                          env=env, capture_output=True, text=True)
+    lines = [line for line in proc.stdout.splitlines() if line.startswith(MARKER)]
+    if not lines:
+        raise RuntimeError(f'{path} failed to import:\n{proc.stderr[-2000:]}')
+    result = json.loads(lines[-1][len(MARKER):])
+    result['imports'] = parse_importtime(proc.stderr)
+    return result
+
+def median(values):
+    values = [v for v in values if v is not None]
+    return round(statistics.median(values), 2) if values else None
+
+def profile(path, handler, event, runs, top):
+    samples = [run_once(path, handler, event) for _ in range(runs)]
+
+    imports = defaultdict(list)
+    clients = defaultdict(list)
+    for sample in samples:
+        for key, ms in sample['imports'].items():
+            imports[key].append(ms)
+        for label, ms in sample['clients'].items():
+            clients[label].append(ms)
+
+    modules = sorted(({'module': name, 'phase': phase, 'ms': median(values)}
+                      for (phase, name), values in imports.items()), key=lambda m: -m['ms'])
+    return {
+        'handler': f'{os.path.relpath(path, ROOT)}:{handler}',
+        'runs': runs,
+        'importMs': median(s['importMs'] for s in samples),
+        'invokeMs': median(s['invokeMs'] for s in samples),
+        'error': samples[-1]['error'],
+        'modules': modules[:top],
+        'clients': {label: median(values) for label, values in clients.items()},
+    }
+
+def print_report(result):
+    print(f"{result['handler']}: import {result['importMs']} ms, "
+          f"first invocation {result['invokeMs']} ms (median of {result['runs']} cold starts)")
+    if result['error']:
+        print(f"  invocation error: {result['error']}")
+    print(f"  {'module':<40} {'phase':<8} {'ms':>8}")
+    for module in result['modules']:
+        print(f"  {module['module']:<40} {module['phase']:<8} {module['ms']:>8}")
+    print(f"  {'client':<40} {'':<8} {'ms':>8}")
+    for label, ms in result['clients'].items():
+        print(f"  {label:<40} {'':<8} {ms:>8}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('handler', help='Path to the handler file, e.g. task-9/submit_order.py')
+    parser.add_argument('--handler-name', default='lambda_handler',
+                        help='Function to invoke (task-6/api_enqueue.py uses handler)')
+    parser.add_argument('--event', help='Invoke the handler once with this JSON event')
+    parser.add_argument('--runs', type=int, default=5, help='Cold starts to take the median of')
+    parser.add_argument('--top', type=int, default=15, help='Modules to list')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    args = parser.parse_args()
+    if args.runs <= 0:
+        parser.error('--runs must be positive')
+
+    name = os.path.splitext(os.path.basename(args.handler))[0]
+    result = profile(args.handler, f'{name}.{args.handler_name}', args.event, args.runs, args.top)
+    result.update({
+        'timestamp': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+    })
+    print_report(result)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"Results written to {args.output}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())